@@ -0,0 +1,1152 @@
+"""
+PlexRPC developer benchmarks. Everything runs against local stand-ins, no Plex account or Discord needed.
+
+    python bench.py sessions [--sizes 1,10,50,100,200] [--rounds 50] [--json results.json]
+    python bench.py reconnect [--rounds 10]
+    python bench.py http [--rounds 50]
+    python bench.py startup [--rounds 5]
+    python bench.py servers [--latencies 0.01,0.05,0.1,0.2] [--rounds 20]
+    python bench.py profiles [--sizes 1,10,50] [--rounds 50]
+    python bench.py wakeups [--engine async] [--idle 5] [--rounds 20] [--max-latency-ms 100]
+    python bench.py scheduler [--plays 200]
+    python bench.py breakers [--outage 600] [--threshold 1]
+    python bench.py replay [--trace trace.jsonl] [--cycles 20000] [--speed 1000]
+    python bench.py logging [--records 2000] [--disk-latency 0.002]
+    python bench.py warmup [--plays 200] [--repeat-share 0.5] [--budget 100]
+    python bench.py soak [--weeks 2] [--items 3000] [--cache-size 500] [--max-growth-kb 256] [--max-updates-per-poll 0.25]
+    python bench.py e2e [--step 5] [--api-latency 0.2] [--api-error-rate 0.1] [--no-websocket] [--json results.json]
+
+The e2e run needs Unix sockets for the fake Discord IPC (Linux, macOS or WSL).
+"""
+import argparse
+import asyncio
+import base64
+import hashlib
+import json
+import logging
+import logging.handlers
+import os
+import multiprocessing
+import platform
+import queue
+import random
+import re
+import socket
+import struct
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
+from concurrent.futures import ThreadPoolExecutor
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from io import BytesIO
+from types import SimpleNamespace
+from xml.sax.saxutils import quoteattr
+
+import main
+
+BENCH_USER = "bench_user"
+
+
+# --- RECORDED PAYLOADS ---
+def session_element(i, user, state="playing"):
+    """One /status/sessions entry shaped like a real server's (media, part and stream children included)"""
+    kind = ("track", "episode", "movie")[i % 3]
+    tag = "Track" if kind == "track" else "Video"
+    attrs = {
+        "ratingKey": 1000 + i, "key": f"/library/metadata/{1000 + i}", "type": kind, "title": f"Title {i}",
+        "librarySectionTitle": "Music" if kind == "track" else "TV Shows" if kind == "episode" else "Movies",
+        "librarySectionID": 1 + i % 3, "viewOffset": 30000 + i, "duration": 240000, "index": 1 + i % 12,
+        "parentIndex": 1 + i % 4, "parentRatingKey": 500 + i // 12, "grandparentRatingKey": 100 + i // 48,
+        "parentTitle": f"Album {i // 12}" if kind == "track" else f"Season {1 + i % 4}",
+        "grandparentTitle": f"Artist {i // 48}" if kind == "track" else f"Show {i // 48}",
+        "sessionKey": i, "addedAt": 1700000000, "updatedAt": 1700000000, "summary": "x" * 200,
+    }
+    attr_xml = " ".join(f"{k}={quoteattr(str(v))}" for k, v in attrs.items())
+    return (f"<{tag} {attr_xml}>"
+            f"<Media id=\"{i}\" duration=\"240000\" bitrate=\"320\" container=\"mp3\">"
+            f"<Part id=\"{i}\" key=\"/library/parts/{i}/file.mp3\" duration=\"240000\" size=\"9600000\">"
+            f"<Stream id=\"{i}\" streamType=\"2\" codec=\"mp3\" channels=\"2\" selected=\"1\"/></Part></Media>"
+            f"<User id=\"{i}\" title={quoteattr(user)} thumb=\"https://plex.tv/users/{i}/avatar\"/>"
+            f"<Player address=\"10.0.0.{i % 250}\" machineIdentifier=\"player-{i}\" platform=\"Windows\" "
+            f"product=\"Plex for Windows\" state=\"{state}\" title=\"Player {i}\"/>"
+            f"<Session id=\"session-{i}\" bandwidth=\"400\" location=\"lan\"/></{tag}>")
+
+
+def sessions_payload(count, user=BENCH_USER):
+    """`count` concurrent sessions where only the last one belongs to `user` (worst case for the filter)"""
+    body = "".join(session_element(i, user if i == count - 1 else f"user{i}") for i in range(count))
+    return f"<MediaContainer size=\"{count}\">{body}</MediaContainer>".encode()
+
+
+# --- STAND-IN SERVERS ---
+WS_GUID = "258EAFA5-E914-47DA-95CA-C5AB0DC85B11"
+
+
+def ws_frame(text):
+    """Single unmasked server-to-client websocket text frame"""
+    data = text.encode()
+    if len(data) < 126:
+        header = bytes([0x81, len(data)])
+    elif len(data) < 65536:
+        header = bytes([0x81, 126]) + struct.pack(">H", len(data))
+    else:
+        header = bytes([0x81, 127]) + struct.pack(">Q", len(data))
+    return header + data
+
+
+class StubServer:
+    """Local HTTP stand-in serving canned bodies per path, with injected latency, counting requests"""
+    content_type = "text/xml"
+
+    def __init__(self, routes=None, latency=0.0):
+        self.latency = latency  # Injected per-request delay in seconds
+        self.routes = dict(routes or {})
+        self.hits = {}
+        self.connections = 0  # Accepted sockets, to see whether clients reuse them
+        self.headers = {}  # Extra headers sent with every response
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def setup(self):
+                super().setup()
+                stub.connections += 1
+                self.connection.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)  # No 40ms delayed-ACK stalls
+
+            def do_GET(self):
+                path = self.path.split("?")[0]
+                stub.hits[path] = stub.hits.get(path, 0) + 1
+                if stub.upgrade(self, path): return
+                if stub.latency: time.sleep(stub.latency)
+                status, body = stub.respond(path)
+                self.send_response(status)
+                self.send_header("Content-Type", stub.content_type)
+                self.send_header("Content-Length", str(len(body)))
+                for name, value in stub.headers.items(): self.send_header(name, value)
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        self.httpd = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.httpd.daemon_threads = True
+        self.url = f"http://127.0.0.1:{self.httpd.server_port}"
+        threading.Thread(target=self.httpd.serve_forever, daemon=True).start()
+
+    def respond(self, path):
+        body = self.routes.get(path, self.fallback(path))
+        body = body() if callable(body) else body
+        return (200, body) if body is not None else (404, b"")
+
+    def fallback(self, path):
+        return None
+
+    def upgrade(self, handler, path):
+        return False
+
+    def requests(self):
+        return sum(self.hits.values())
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+
+class StubPlex(StubServer):
+    """Minimal Plex Media Server stand-in, including the notification websocket"""
+
+    def __init__(self, routes=None, latency=0.0):
+        self.sockets = []
+        super().__init__(dict({"/": b"<MediaContainer friendlyName=\"Bench\" machineIdentifier=\"bench\" "
+                                     b"version=\"1.40.0\"/>"}, **(routes or {})), latency)
+
+    def fallback(self, path):
+        # Album/show listings used for prefetching. Empty: the e2e script doesn't play through an album
+        if path.startswith("/library/metadata/"): return b"<MediaContainer size=\"0\"/>"
+        return None
+
+    def upgrade(self, handler, path):
+        if path != "/:/websockets/notifications" or handler.headers.get("Upgrade", "").lower() != "websocket":
+            return False
+        key = handler.headers["Sec-WebSocket-Key"] + WS_GUID
+        handler.send_response(101)
+        handler.send_header("Upgrade", "websocket")
+        handler.send_header("Connection", "Upgrade")
+        handler.send_header("Sec-WebSocket-Accept", base64.b64encode(hashlib.sha1(key.encode()).digest()).decode())
+        handler.end_headers()
+        handler.close_connection = True
+        outbox = queue.Queue()
+        self.sockets.append(outbox)
+        try:
+            for message in iter(outbox.get, None):
+                handler.wfile.write(ws_frame(message))
+        except OSError:
+            pass
+        finally:
+            self.sockets.remove(outbox)
+        return True
+
+    def notify(self, container):
+        """Pushes a NotificationContainer to every connected websocket client"""
+        message = json.dumps({"NotificationContainer": container})
+        for outbox in list(self.sockets): outbox.put(message)
+
+    def stop(self):
+        for outbox in list(self.sockets): outbox.put(None)
+        super().stop()
+
+
+class StubAPI(StubServer):
+    """PlexRPC API stand-in: config endpoint plus metadata lookups with a configurable error rate"""
+    content_type = "application/json"
+
+    def __init__(self, latency=0.0, error_rate=0.0, seed=1):
+        self.error_rate, self.random = error_rate, random.Random(seed)
+        self.down = False  # Every endpoint answers 503
+        super().__init__(latency=latency)
+
+    def respond(self, path):
+        if self.down: return 503, b"{}"
+        if path == "/api/config/discord-id":
+            return 200, json.dumps({"client_id": "100000000000000001", "latest_version": main.VERSION}).encode()
+        if not path.startswith("/api/metadata/"): return 404, b""
+        if self.random.random() < self.error_rate: return 503, b"{}"
+        return 200, json.dumps({"found": True, "image": "https://example.invalid/cover.jpg",
+                                "url": "https://example.invalid/item"}).encode()
+
+
+class FakeDiscord:
+    """Discord IPC stand-in on a Unix socket: answers the handshake and records every SET_ACTIVITY"""
+
+    def __init__(self, directory):
+        self.path = os.path.join(directory, "discord-ipc-0")
+        self.updates = []  # (received_at, activity or None for a clear)
+        self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.sock.bind(self.path)
+        self.sock.listen(8)
+        threading.Thread(target=self._accept, daemon=True).start()
+
+    def _accept(self):
+        while True:
+            try:
+                conn, _ = self.sock.accept()
+            except OSError:
+                return
+            threading.Thread(target=self._serve, args=(conn,), daemon=True).start()
+
+    @staticmethod
+    def _read(conn, size):
+        data = b""
+        while len(data) < size:
+            chunk = conn.recv(size - len(data))
+            if not chunk: return None
+            data += chunk
+        return data
+
+    def _serve(self, conn):
+        with conn:
+            while True:
+                header = self._read(conn, 8)
+                if not header: return
+                op, length = struct.unpack("<II", header)
+                payload = json.loads(self._read(conn, length) or b"{}")
+                if op == 0:
+                    reply = {"cmd": "DISPATCH", "evt": "READY", "data": {"v": 1, "user": {"id": "1"}}}
+                elif op == 1:
+                    activity = payload.get("args", {}).get("activity")
+                    self.updates.append((time.time(), activity))
+                    reply = {"cmd": payload.get("cmd"), "evt": None, "data": activity, "nonce": payload.get("nonce")}
+                else:
+                    return
+                body = json.dumps(reply).encode()
+                conn.sendall(struct.pack("<II", 1, len(body)) + body)
+
+    def stop(self):
+        self.sock.close()
+
+
+def timed(fn, rounds):
+    """Median and p95 wall time of `fn` in milliseconds"""
+    samples = []
+    for _ in range(rounds):
+        start = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - start) * 1000)
+    samples.sort()
+    return {"median_ms": round(samples[len(samples) // 2], 3), "p95_ms": round(samples[int(len(samples) * 0.95)], 3)}
+
+
+@contextmanager
+def make_app(config, servers=None, api_url=None, workdir=None, headless=True):
+    """PlexPresence on a scratch data dir: config.json gets bench defaults plus `config`, connection.json
+    gets the `servers` {name: uri}. main's file paths and API_URL are restored on exit"""
+    workdir = workdir or tempfile.mkdtemp()
+    saved = main.CONFIG_FILE, main.CACHE_FILE, main.CONNECTION_FILE, main.REMOTE_CONFIG_FILE, main.API_URL
+    main.CONFIG_FILE, main.CACHE_FILE, main.CONNECTION_FILE, main.REMOTE_CONFIG_FILE = (
+        os.path.join(workdir, name) for name in ("config.json", "metadata_cache.json", "connection.json",
+                                                 "remote_config.json"))
+    if api_url: main.API_URL = api_url
+    try:
+        with open(main.CONFIG_FILE, "w") as f:
+            json.dump({"auth_token": "bench-token", "server_name": "Bench", "user_filter": BENCH_USER,
+                       "client_uuid": "bench", **config}, f)
+        if servers:
+            with open(main.CONNECTION_FILE, "w") as f:
+                json.dump({name: {"uri": uri, "token": "bench-token", "machine_id": "bench"}
+                           for name, uri in servers.items()}, f)
+        yield main.PlexPresence(headless=headless)
+    finally:
+        main.CONFIG_FILE, main.CACHE_FILE, main.CONNECTION_FILE, main.REMOTE_CONFIG_FILE, main.API_URL = saved
+
+
+# --- BENCHMARKS ---
+def bench_sessions(args):
+    """plexapi's sessions() + username scan vs. the filtered streaming parser, parse-only and over HTTP"""
+    from plexapi.server import PlexServer
+
+    link = main.PlexServerLink("Bench", "bench-token", None)
+    results = []
+    for size in args.sizes:
+        payload = sessions_payload(size)
+        stub = StubPlex({"/status/sessions": payload})
+        try:
+            link.plex = PlexServer(stub.url, "bench-token")
+
+            def plexapi_path():
+                return next(s for s in link.plex.sessions() if BENCH_USER in s.usernames)
+
+            def fast_path():
+                return link.fetch_sessions(BENCH_USER)[0]
+
+            assert plexapi_path().title == fast_path().title
+            results.append({
+                "sessions": size,
+                "payload_bytes": len(payload),
+                "parse_plexapi": timed(lambda: link.plex.findItems(main.ET.fromstring(payload)), args.rounds),
+                "parse_fast": timed(lambda: main.parse_sessions(BytesIO(payload), BENCH_USER), args.rounds),
+                "http_plexapi": timed(plexapi_path, args.rounds),
+                "http_fast": timed(fast_path, args.rounds),
+            })
+        finally:
+            stub.stop()
+
+    print(f"{'sessions':>8} {'bytes':>9} {'parse plexapi':>14} {'parse fast':>11} {'http plexapi':>13} {'http fast':>10}")
+    for r in results:
+        print(f"{r['sessions']:>8} {r['payload_bytes']:>9} {r['parse_plexapi']['median_ms']:>12.2f}ms "
+              f"{r['parse_fast']['median_ms']:>9.2f}ms {r['http_plexapi']['median_ms']:>11.2f}ms "
+              f"{r['http_fast']['median_ms']:>8.2f}ms")
+    return results
+
+
+def bench_reconnect(args):
+    """Reconnect time via the cached URI, racing all candidates, and waiting on every candidate (plexapi's way)"""
+    from plexapi.server import PlexServer
+
+    latencies = {"local": 0.005, "remote": 0.08, "relay": 0.3, "hung": 3.0}
+    stubs = {name: StubPlex(latency=latency) for name, latency in latencies.items()}
+    main.CONNECTION_FILE = os.path.join(tempfile.mkdtemp(), "connection.json")
+    logging.getLogger("urllib3").setLevel(logging.ERROR)  # Abandoned "hung" probes overflow the pool on purpose
+    session = main.HttpClient(pool_size=8, retries=0).session
+    # Preference order as plex.tv would list it, slowest first to show the race doesn't depend on it
+    urls = [stubs[n].url for n in ("hung", "relay", "remote", "local")]
+    resource = SimpleNamespace(name="Bench", accessToken="bench-token", preferred_connections=lambda: urls)
+
+    def wait_all():
+        with ThreadPoolExecutor(max_workers=len(urls)) as pool:
+            futures = [pool.submit(PlexServer, url, "bench-token", session, 10) for url in urls]
+            return next(f.result() for f in futures if not f.exception())
+
+    try:
+        main.save_connection("Bench", main.race_connections(resource, session))
+        results = {
+            "latencies_s": latencies,
+            "cached": timed(lambda: main.connect_cached("Bench", session), args.rounds),
+            "race": timed(lambda: main.race_connections(resource, session), args.rounds),
+            "wait_all": timed(wait_all, max(1, args.rounds // 5)),
+        }
+    finally:
+        for stub in stubs.values(): stub.stop()
+
+    for name in ("cached", "race", "wait_all"):
+        print(f"{name:>9}: {results[name]['median_ms']:>9.1f}ms median, {results[name]['p95_ms']:>9.1f}ms p95")
+    return results
+
+
+def bench_http(args):
+    """Sockets opened per request by the shared keep-alive clients (remote config, metadata lookups, Plex polls),
+    and how long a first-run config fetch blocks when the API answers 503 with a long Retry-After"""
+    import requests
+
+    plex = StubPlex({"/status/sessions": sessions_payload(5)})
+    api = StubAPI()
+    try:
+        with make_app({"realtime_updates": False, "prefetch_count": 0}, {"Bench": plex.url}, api.url) as app:
+            if not app.connect_plex(): sys.exit("Could not connect to the stub server")
+            plex.connections = api.connections = 0
+            for i in range(args.rounds):
+                main.fetch_config("bench", main.VERSION)
+                app.fetcher._fetch(("movie", f"Bench Movie {i}", None))
+                app.fetch_sessions()
+            pooled = {"plex": plex.connections, "api": api.connections}
+
+            api.connections = 0
+            for _ in range(args.rounds):
+                requests.get(f"{api.url}/api/config/discord-id", timeout=5)
+            one_shot = api.connections
+
+            api.down, api.headers = True, {"Retry-After": "30"}
+            started = time.perf_counter()
+            main.fetch_config("bench", main.VERSION)
+            blocked = time.perf_counter() - started
+    finally:
+        plex.stop()
+        api.stop()
+
+    # Whatever the retries' own backoff adds up to, plus a second of slack
+    max_block = sum(main.HTTP_BACKOFF * 2 ** n for n in range(main.HTTP_RETRIES)) + 1
+    results = {
+        "rounds": args.rounds, "api_requests_per_round": 2, "sockets_pooled": pooled, "sockets_one_shot_api": one_shot,
+        "retry_after_s": 30, "config_fetch_blocked_s": round(blocked, 2), "max_block_s": max_block,
+    }
+    for key, value in results.items(): print(f"{key:>22}: {value}")
+    if max(pooled.values()) > 2:
+        results["failed"] = f"Keep-alive isn't holding: {pooled} sockets for {args.rounds} rounds"
+    elif blocked > max_block:
+        results["failed"] = f"fetch_config blocked {blocked:.1f}s on Retry-After"
+    return results
+
+
+# Scripted playback: (session index to show or None, player state). Index parity picks track/episode/movie
+E2E_SCRIPT = [(0, "playing"), (0, "paused"), (0, "playing"), (3, "playing"), (1, "playing"), (None, None)]
+
+
+def e2e_expected(index, state):
+    """What Discord should end up showing for a script step (None = cleared)"""
+    if index is None: return None
+    kind = ("track", "episode", "movie")[index % 3]
+    return f"Show {index // 48}" if kind == "episode" else f"Title {index}", state == "paused"
+
+
+def e2e_matches(activity, expected):
+    if expected is None: return activity is None
+    return bool(activity) and activity.get("details") == expected[0] and \
+        ("Paused" in activity.get("state", "")) == expected[1]
+
+
+def run_stand_ins(pipe, options):
+    """Child process hosting stub Plex, stub API and fake Discord, then playing E2E_SCRIPT"""
+    crowd = "".join(session_element(100 + i, f"user{i}") for i in range(options["other_sessions"]))
+    current = {"xml": f"<MediaContainer>{crowd}</MediaContainer>".encode()}
+    plex = StubPlex({"/status/sessions": lambda: current["xml"]})
+    api = StubAPI(options["api_latency"], options["api_error_rate"])
+    discord = FakeDiscord(options["ipc_dir"])
+    pipe.send({"plex": plex.url, "api": api.url})
+    pipe.recv()  # Presence is connected and idle
+
+    started, changes, previous = time.time(), [], None
+    for index, state in E2E_SCRIPT:
+        time.sleep(options["step"])
+        mine = session_element(index, BENCH_USER, state) if index is not None else ""
+        current["xml"] = f"<MediaContainer>{crowd}{mine}</MediaContainer>".encode()
+        changes.append(time.time())
+        key = index if index is not None else previous
+        plex.notify({"type": "playing", "size": 1, "PlaySessionStateNotification": [{
+            "sessionKey": str(key), "ratingKey": str(1000 + key), "state": state or "stopped", "viewOffset": 30000}]})
+        previous = index
+    time.sleep(options["step"])
+    elapsed = time.time() - started
+
+    pipe.send({"changes": changes, "updates": discord.updates, "elapsed": elapsed,
+               "requests": {"plex": plex.requests(), "plex_sessions": plex.hits.get("/status/sessions", 0),
+                            "api": api.requests(), "discord": len(discord.updates)}})
+    for stand_in in (plex, api, discord): stand_in.stop()
+
+
+def peak_rss_mb():
+    try:
+        import resource
+    except ImportError:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return round(peak / (1024 * 1024 if sys.platform == "darwin" else 1024), 1)
+
+
+def bench_e2e(args):
+    """The real update loop (get_activity -> RPC publish -> tray) against all three stand-ins"""
+    if not hasattr(socket, "AF_UNIX"):
+        sys.exit("e2e needs Unix sockets for the fake Discord IPC, run it under Linux, macOS or WSL")
+    workdir = tempfile.mkdtemp()
+    os.environ["XDG_RUNTIME_DIR"] = workdir  # Where pypresence looks for discord-ipc-0
+    options = {"ipc_dir": workdir, "step": args.step, "api_latency": args.api_latency,
+               "api_error_rate": args.api_error_rate, "other_sessions": args.other_sessions}
+    pipe, child_pipe = multiprocessing.Pipe()
+    child = multiprocessing.Process(target=run_stand_ins, args=(child_pipe, options), daemon=True)
+    child.start()
+    urls = pipe.recv()
+
+    config = {"audiobook_libraries": [], "metrics": True, "realtime_updates": not args.no_websocket,
+              "engine": args.engine, "trace_file": args.trace}
+    with make_app(config, {"Bench": urls["plex"]}, urls["api"], workdir, headless=False) as app:
+        app.tray_icon = SimpleNamespace(title="", icon=None)
+        cpu_started = time.process_time()
+        threading.Thread(target=app.run, daemon=True).start()
+        deadline = time.time() + 30
+        while not (app.plex and app.rpc) and time.time() < deadline: time.sleep(0.05)
+        if not (app.plex and app.rpc): sys.exit("Presence never connected to the stand-ins")
+        pipe.send("go")
+        report = pipe.recv()
+        cpu = time.process_time() - cpu_started
+        stages = main.metrics.snapshot()["stages"]
+        app.stop()
+    child.join(5)
+
+    changes, updates = report["changes"], report["updates"]
+    latencies = []
+    for i, (changed_at, step) in enumerate(zip(changes, E2E_SCRIPT)):
+        until = changes[i + 1] if i + 1 < len(changes) else float("inf")
+        expected = e2e_expected(*step)
+        hit = next((t for t, activity in updates if changed_at <= t < until and e2e_matches(activity, expected)), None)
+        latencies.append(round((hit - changed_at) * 1000, 1) if hit else None)
+    landed = sorted(l for l in latencies if l is not None)
+    per_hour = 3600 / report["elapsed"]
+    results = {
+        "engine": args.engine, "websocket": not args.no_websocket, "step_s": args.step, "api_latency_s": args.api_latency,
+        "api_error_rate": args.api_error_rate, "other_sessions": args.other_sessions,
+        "change_to_update_ms": latencies,
+        "change_to_update_median_ms": landed[len(landed) // 2] if landed else None,
+        "missed_changes": latencies.count(None),
+        "requests_per_hour": {name: round(n * per_hour) for name, n in report["requests"].items()},
+        "cpu_s": round(cpu, 3), "peak_rss_mb": peak_rss_mb(),
+        "stages_avg_ms": {stage: round(h["sum"] / h["count"] * 1000, 2) for stage, h in stages.items() if h["count"]},
+    }
+    print(f"change -> update: {latencies} ms (median {results['change_to_update_median_ms']}, "
+          f"missed {results['missed_changes']})")
+    print(f"requests/hour: {results['requests_per_hour']}")
+    print(f"cpu: {results['cpu_s']}s over {report['elapsed']:.0f}s, peak rss: {results['peak_rss_mb']} MB")
+    print(f"stage averages: {results['stages_avg_ms']}")
+    return results
+
+
+STARTUP_PROBE = """
+import json, sys, time
+started = time.perf_counter()
+import main
+imported = time.perf_counter()
+app = main.PlexPresence(headless=True)
+constructed = time.perf_counter()
+result = {"import_main_ms": (imported - started) * 1000, "construct_ms": (constructed - imported) * 1000,
+          "modules_loaded": len(sys.modules), "gui_loaded": "tkinter" in sys.modules or "PIL" in sys.modules}
+try:
+    import resource
+    result["rss_after_import_mb"] = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+except ImportError:
+    pass
+icon = main.ICON_PNG
+started = time.perf_counter()
+for color in main.STATUS_COLORS: main.create_status_icon(icon, color)
+result["icons_first_ms"] = (time.perf_counter() - started) * 1000
+started = time.perf_counter()
+for color in main.STATUS_COLORS: main.create_status_icon(icon, color)
+result["icons_cached_ms"] = (time.perf_counter() - started) * 1000
+print(json.dumps(result))
+"""
+
+
+def bench_startup(args):
+    """Cold-start profile in fresh interpreters: import, construction, icon rendering and the heaviest imports"""
+    workdir = tempfile.mkdtemp()
+    with open(os.path.join(workdir, "config.json"), "w") as f:
+        json.dump({"auth_token": "bench-token", "server_name": "Bench", "user_filter": BENCH_USER,
+                   "client_uuid": "bench"}, f)
+    env = dict(os.environ, PLEXRPC_DIR=workdir, PYTHONDONTWRITEBYTECODE="1")
+    cwd = os.path.dirname(os.path.abspath(__file__))
+
+    runs = []
+    for _ in range(args.rounds):
+        out = subprocess.run([sys.executable, "-c", STARTUP_PROBE], env=env, cwd=cwd, capture_output=True, text=True)
+        if out.returncode: sys.exit(out.stderr)
+        runs.append(json.loads(out.stdout.strip().splitlines()[-1]))
+    results = {key: round(sorted(r[key] for r in runs)[len(runs) // 2], 2) if isinstance(runs[0][key], float)
+               else runs[0][key] for key in runs[0]}
+
+    # Heaviest direct imports of main by cumulative time
+    trace = subprocess.run([sys.executable, "-X", "importtime", "-c", "import main"], env=env, cwd=cwd,
+                           capture_output=True, text=True).stderr
+    heaviest = []
+    for line in trace.splitlines():
+        parts = line.split("|")
+        # importtime indents nested imports by two spaces per level after the separator's own space
+        if len(parts) == 3 and parts[1].strip().isdigit() and parts[2].startswith("   ") \
+                and not parts[2].startswith("     "):
+            heaviest.append((int(parts[1]), parts[2].strip()))
+    results["heaviest_imports_ms"] = {name: round(us / 1000, 1) for us, name in sorted(heaviest, reverse=True)[:10]}
+
+    for key, value in results.items(): print(f"{key:>22}: {value}")
+    return results
+
+
+class CountingRPC:
+    """Discord client stand-in that only counts updates and clears, for either engine"""
+
+    def __init__(self, is_async):
+        self.is_async, self.updates, self.clears, self.sock_writer = is_async, 0, 0, None
+
+    def update(self, **activity):
+        self.updates += 1
+        if self.is_async: return asyncio.sleep(0)
+
+    def clear(self):
+        self.clears += 1
+        if self.is_async: return asyncio.sleep(0)
+
+    def close(self):
+        pass
+
+
+def wait_for(condition, timeout=5):
+    """Seconds until condition() held, None if it never did"""
+    started = time.perf_counter()
+    while not condition():
+        if time.perf_counter() - started > timeout: return None
+        time.sleep(0.0005)
+    return time.perf_counter() - started
+
+
+def bench_wakeups(args):
+    """How fast pause, unpause and quit reach the loop, and how often it wakes while it has nothing to do"""
+    with make_app({"metrics": True, "engine": args.engine}) as app:
+        app.connect_plex = lambda: False  # Plex stays down, so the loop sits in its reconnect wait
+        for link in app.servers.values():
+            link.breaker.base_delay = link.breaker.max_delay = 3600
+            link.breaker.failure("bench")
+        app.load_discord_client_id = lambda: None
+        rpc = app.rpc = CountingRPC(args.engine == "async")
+        wakeups = lambda: main.metrics.snapshot()["counters"].get("loop_wakeups", 0)
+
+        thread = threading.Thread(target=app.run, args=(args.engine,), daemon=True)
+        thread.start()
+        if wait_for(lambda: wakeups() > 0) is None: sys.exit("Loop never started")
+        time.sleep(0.2)
+
+        before = wakeups()
+        time.sleep(args.idle)
+        reconnect_wait = wakeups() - before
+
+        pause, unpause = [], []
+        for _ in range(min(args.rounds, 20)):
+            app.publisher.shown = True  # As if something was on Discord
+            app.set_paused(True)
+            pause.append(wait_for(lambda: app.status_text == "Presence Paused"))
+            time.sleep(0.05)
+            app.set_paused(False)
+            unpause.append(wait_for(lambda: app.status_text != "Presence Paused"))
+            time.sleep(0.05)
+        clears = rpc.clears
+
+        app.set_paused(True)
+        time.sleep(0.2)
+        before, clears_before = wakeups(), rpc.clears
+        time.sleep(args.idle)
+        paused_wakeups, paused_clears = wakeups() - before, rpc.clears - clears_before
+
+        started = time.perf_counter()
+        app.stop()
+        thread.join(5)
+        quit_s = None if thread.is_alive() else time.perf_counter() - started
+
+    ms = lambda values: sorted(round(v * 1000, 2) for v in values if v is not None)
+    results = {
+        "engine": args.engine, "idle_s": args.idle,
+        "pause_ms": ms(pause), "unpause_ms": ms(unpause), "quit_ms": ms([quit_s]),
+        "clears_per_pause": round(clears / len(pause), 2),
+        "wakeups_reconnect_wait": reconnect_wait, "wakeups_paused": paused_wakeups, "clears_while_paused": paused_clears,
+    }
+    for key, value in results.items(): print(f"{key:>22}: {value}")
+    latencies = pause + unpause + [quit_s]
+    if None in latencies or max(latencies) * 1000 > args.max_latency_ms:
+        results["failed"] = f"Pause/unpause/quit took longer than {args.max_latency_ms} ms to reach the loop"
+    elif results["clears_per_pause"] != 1:
+        results["failed"] = f"Expected one Discord clear per pause, got {results['clears_per_pause']}"
+    elif reconnect_wait or paused_wakeups or paused_clears:
+        results["failed"] = "The loop woke up while it had nothing to do"
+    return results
+
+
+def bench_servers(args):
+    """One sessions cycle across several servers with different latencies, healthy and with one server down"""
+    # Paused on the fastest server, playing on the slowest: the playing one must win
+    stubs = [StubPlex({"/status/sessions": f"<MediaContainer>{session_element(i, BENCH_USER, state)}"
+                                           f"</MediaContainer>".encode()}, latency)
+             for i, latency in enumerate(args.latencies)
+             for state in ["playing" if i == len(args.latencies) - 1 else "paused"]]
+    names = [f"Server {i}" for i in range(len(stubs))]
+    try:
+        with make_app({"servers": names, "realtime_updates": False},
+                      {name: stub.url for name, stub in zip(names, stubs)}) as app:
+            if not app.connect_plex(): sys.exit("Could not connect to the stub servers")
+            app.fetch_sessions()  # Warm the connection pools
+            picked = min(app.fetch_sessions(), key=app.session_priority)
+            healthy = timed(app.fetch_sessions, args.rounds)
+            stubs[0].stop()
+            app.servers[names[0]].plex._baseurl = "http://127.0.0.1:9"  # Pooled keep-alive sockets would still answer
+            down = timed(app.fetch_sessions, args.rounds)
+            health = {name: link.describe() for name, link in app.servers.items()}
+    finally:
+        for stub in stubs[1:]: stub.stop()
+
+    results = {
+        "latencies_ms": [round(l * 1000) for l in args.latencies], "picked": picked.server_name,
+        "cycle_healthy": healthy, "cycle_one_down": down,
+        "sum_of_latencies_ms": round(sum(args.latencies) * 1000), "slowest_ms": round(max(args.latencies) * 1000),
+        "health_after": health,
+    }
+    for key, value in results.items(): print(f"{key:>20}: {value}")
+    return results
+
+
+def bench_profiles(args):
+    """Multi-profile fan-out: poll cost and Plex requests per cycle at 1, 10 and 50 profiles sharing one fetch"""
+    counts = [c for c in args.sizes if c <= 50] or [1, 10, 50]
+    members = [f"member{i}" for i in range(max(counts))]
+    crowd = "".join(session_element(100 + i, f"user{i}") for i in range(args.other_sessions))
+    household = "".join(session_element(i, user) for i, user in enumerate(members))
+    plex = StubPlex({"/status/sessions": f"<MediaContainer>{household}{crowd}</MediaContainer>".encode()})
+    api = StubAPI()
+    results = []
+    try:
+        for count in counts:
+            workdir = tempfile.mkdtemp()
+            profiles = [{"user_filter": user, "output": os.path.join(workdir, f"{user}.json")}
+                        for user in members[1:count]]
+            config = {"user_filter": members[0], "realtime_updates": False, "prefetch_count": 0, "profiles": profiles}
+            with make_app(config, {"Bench": plex.url}, api.url, workdir) as app:
+                if not app.connect_plex(): sys.exit("Could not connect to the stub server")
+
+                def cycle():
+                    activity = app.get_activity()
+                    if app.profiles: app.publish_profiles(app.profile_activities(app.last_sessions))
+                    return activity
+
+                cycle()
+                wait_for(lambda: not app.fetcher.in_flight, 10)  # Let the shared cache fill
+                api_lookups = api.hits.get("/api/metadata/music", 0) + api.hits.get("/api/metadata/tv", 0) + \
+                    api.hits.get("/api/metadata/movie", 0)
+                api.hits.clear()
+                hits_before = plex.hits.get("/status/sessions", 0)
+                warm = timed(cycle, args.rounds)
+                outputs = sum(1 for p in profiles if os.path.exists(p["output"]))
+                results.append({
+                    "profiles": count, "cycle": warm,
+                    "plex_requests_per_cycle": (plex.hits["/status/sessions"] - hits_before) / args.rounds,
+                    "api_lookups_cold": api_lookups, "api_lookups_warm": sum(api.hits.values()),
+                    "outputs_written": outputs,
+                })
+                app.stop()
+    finally:
+        plex.stop()
+        api.stop()
+
+    print(f"{'profiles':>8} {'cycle median':>13} {'p95':>9} {'plex req/cycle':>15} {'api cold':>9} {'api warm':>9}")
+    for r in results:
+        print(f"{r['profiles']:>8} {r['cycle']['median_ms']:>11.2f}ms {r['cycle']['p95_ms']:>7.2f}ms "
+              f"{r['plex_requests_per_cycle']:>15} {r['api_lookups_cold']:>9} {r['api_lookups_warm']:>9}")
+    return results
+
+
+def scheduler_timeline(plays, rng):
+    """(state, start, seconds) segments: tracks and episodes back to back, with pauses and idle gaps in between"""
+    segments, at = [], 0.0
+    for play in range(plays):
+        duration = rng.uniform(60, 2700)
+        segments.append(("playing", at, duration))
+        at += duration
+        if play % 5 == 4:
+            state = "paused" if play % 10 == 4 else None
+            segments.append((state, at, rng.uniform(600, 3600)))
+            at += segments[-1][2]
+    return segments
+
+
+def bench_scheduler(args):
+    """PollScheduler on a virtual clock: polls land just past item boundaries, idle and paused back off to the cap,
+    and playback or a notification snaps polling back to the base interval"""
+    clock = main.VirtualClock()
+    scheduler = main.PollScheduler(clock=clock)
+    interval, cap, tolerance = main.POLL_INTERVAL, main.MAX_IDLE_INTERVAL, 1e-6
+    segments = scheduler_timeline(args.plays, random.Random(1))
+    end, index, polls, problems = segments[-1][1] + segments[-1][2], 0, 0, []
+    boundary_lags, backoffs, backoff, last_item = [], [], [], None
+    while clock() < end:
+        while clock() >= segments[index][1] + segments[index][2]: index += 1
+        state, start, seconds = segments[index]
+        polls += 1
+        if state == "playing":
+            if last_item is not None and last_item != index:
+                boundary_lags.append(clock() - start)  # Seconds the new item went unnoticed
+            last_item = index
+            scheduler.observe("playing", (clock() - start) * 1000, seconds * 1000)
+            if backoff: backoffs.append(backoff)
+            backoff = []
+        else:
+            last_item = None
+            scheduler.observe(state)
+        delay = scheduler.next_delay(interval)
+        if state == "playing":
+            # Next poll just past the end of the item, never sooner than the busy-loop floor
+            remaining = start + seconds - clock()
+            expected = max(main.MIN_POLL_INTERVAL, min(interval, remaining + main.BOUNDARY_SLACK))
+            if abs(delay - expected) > tolerance:
+                problems.append(f"Playing poll waits {delay:.2f}s with {remaining:.2f}s left, expected {expected:.2f}s")
+        else:
+            expected = min(interval * 2 ** len(backoff), cap)
+            if abs(delay - expected) > tolerance:
+                problems.append(f"Backoff step {len(backoff) + 1} is {delay:.1f}s, expected {expected:.1f}s")
+            if len(backoff) == 3:  # A notification arrives mid-backoff
+                scheduler.activity()
+                if abs(scheduler.next_delay(interval) - interval) > tolerance:
+                    problems.append("activity() did not reset the backoff")
+                scheduler.idle_polls = len(backoff) + 1  # Back to where the script was
+            backoff.append(delay)
+        clock.advance(delay)
+    max_lag = max(main.BOUNDARY_SLACK, main.MIN_POLL_INTERVAL)
+    late = [round(lag, 2) for lag in boundary_lags if lag > max_lag + tolerance]
+    if late: problems.append(f"{len(late)} item changes noticed later than {max_lag}s: {late[:5]}")
+    short = [b for b in backoffs if b[-1] < cap]
+    if short: problems.append(f"{len(short)} idle/paused stretches never reached the {cap}s cap")
+
+    results = {
+        "simulated_h": round(end / 3600, 1), "polls": polls, "fixed_interval_polls": int(end // interval),
+        "item_changes": len(boundary_lags), "max_boundary_lag_s": round(max(boundary_lags, default=0), 3),
+        "backoff_stretches": len(backoffs), "backoff_steps_s": backoffs[0][:6] if backoffs else [],
+    }
+    for key, value in results.items(): print(f"{key:>20}: {value}")
+    if problems: results["failed"] = "; ".join(problems[:5])
+    return results
+
+
+def bench_breakers(args):
+    """Circuit breaker on a virtual clock: how many calls reach a dead dependency, and how fast it closes again"""
+    clock = main.VirtualClock()
+    breaker = main.CircuitBreaker("Bench", threshold=args.threshold, clock=clock)
+    dead_until, attempts, opened, backoffs = args.outage, 0, [], []
+    while clock() < dead_until + main.BREAKER_MAX_DELAY:
+        if breaker.allow():
+            attempts += 1
+            if clock() < dead_until:
+                breaker.failure("bench outage")
+                if breaker.retry_in(): backoffs.append(round(breaker.retry_in(), 1))
+            else:
+                breaker.success()
+                break
+        opened.append(breaker.is_open())
+        clock.advance(1)  # One loop iteration per second, the naive retry rate
+    results = {
+        "outage_s": args.outage, "calls_without_breaker": int(args.outage) + 1, "calls_with_breaker": attempts,
+        "backoffs_s": backoffs, "recovered_after_s": round(clock() - dead_until, 1),
+        "open_share": round(sum(opened) / max(len(opened), 1), 3),
+    }
+    for key, value in results.items(): print(f"{key:>22}: {value}")
+    return results
+
+
+def soak_payload(item, offset, state):
+    """/status/sessions body for the soak run's current item, next to the same crowd of other users"""
+    mine = re.sub(r'viewOffset="\d+"', f'viewOffset="{offset}"', session_element(item, BENCH_USER, state), 1) \
+        if item is not None else ""
+    return f"<MediaContainer>{mine}{SOAK_CROWD}</MediaContainer>".encode()
+
+
+SOAK_CROWD = "".join(session_element(100000 + i, f"user{i}") for i in range(5))
+
+
+def bench_soak(args):
+    """Weeks of simulated playback against the stub server in fast-forward, checking memory stays bounded"""
+    import gc
+    import tracemalloc
+    now_playing = {"body": soak_payload(None, 0, None)}
+    plex = StubPlex({"/status/sessions": lambda: now_playing["body"]})
+    api = StubAPI()
+    config = {"realtime_updates": False, "metrics": True, "metadata_cache_size": args.cache_size}
+    with make_app(config, {"Bench": plex.url}, api.url) as app:
+        clock = main.VirtualClock(time.time())
+        # Presence timestamps move with the simulated playback too, otherwise no snapshot ever continues the last one
+        app.clock = clock
+        app.publisher, app.scheduler = main.RPCPublisher(clock=clock), main.PollScheduler(clock=clock)
+        rpc = CountingRPC(False)
+        if not app.connect_plex(): sys.exit("Could not connect to the stub server")
+
+        polls = int(args.weeks * 7 * 24 * 3600 / main.POLL_INTERVAL)
+        polls_per_item, polls_per_day = 240 // main.POLL_INTERVAL, 24 * 3600 // main.POLL_INTERVAL
+        started, samples, warmup = time.perf_counter(), [], None
+        try:
+            for poll in range(polls):
+                slot, step = divmod(poll, polls_per_item)
+                item = slot % args.items
+                # Every 10th slot nothing plays, every 7th item gets paused halfway through
+                state = "paused" if item % 7 == 0 and step >= polls_per_item // 2 else "playing"
+                now_playing["body"] = soak_payload(None if slot % 10 == 9 else item, step * 15000, state)
+                activity = app.get_activity()
+                if activity:
+                    app.publisher.publish(rpc, activity)
+                else:
+                    app.publisher.clear(rpc)
+                clock.advance(main.POLL_INTERVAL)
+                if poll % polls_per_day == polls_per_day - 1 or poll == polls - 1:
+                    wait_for(lambda: not app.fetcher.in_flight, 10)
+                    gc.collect()
+                    if warmup is None:  # First simulated day fills the cache and pools, track growth after it
+                        tracemalloc.start()
+                        warmup = tracemalloc.get_traced_memory()[0]
+                    samples.append(round((tracemalloc.get_traced_memory()[0] - warmup) / 1024, 1))
+        finally:
+            tracemalloc.stop()
+            app.stop()
+            plex.stop()
+            api.stop()
+
+    growth = samples[-1] - min(samples[len(samples) // 2:]) if len(samples) > 2 else samples[-1]
+    snapshot = next(iter(main.parse_sessions(BytesIO(soak_payload(0, 0, "playing")), BENCH_USER, "Bench")))
+    results = {
+        "simulated_days": round(polls / polls_per_day, 1), "polls": polls, "wall_s": round(time.perf_counter() - started, 1),
+        "items": args.items, "cache_size": args.cache_size, "cache_entries": app.cache.stats()["entries"],
+        "discord_updates": rpc.updates, "discord_clears": rpc.clears,
+        "updates_per_poll": round(rpc.updates / polls, 3), "max_updates_per_poll": args.max_updates_per_poll,
+        "traced_kb_per_day": samples, "growth_second_half_kb": growth, "max_growth_kb": args.max_growth_kb,
+        "snapshot_bytes": sys.getsizeof(snapshot), "peak_rss_mb": peak_rss_mb(),
+    }
+    for key, value in results.items(): print(f"{key:>22}: {value}")
+    if growth > args.max_growth_kb:
+        results["failed"] = f"Memory kept growing: {growth} KB over the second half of the run"
+    elif results["updates_per_poll"] > args.max_updates_per_poll:
+        # About two per item (Plex-only, then with artwork), unless unchanged playback stopped being diffed away
+        results["failed"] = f"{results['updates_per_poll']} Discord updates per poll, snapshot diffing isn't holding"
+    return results
+
+
+def warmup_library(rng):
+    """Stub Plex routes for the warm-up sources plus the items played afterwards. Returns (routes, pool, fresh)"""
+    audiobook = lambda i: re.sub(r'librarySectionTitle="Music" librarySectionID="\d+"',
+                                 'librarySectionTitle="Audiobooks" librarySectionID="4"', session_element(i, BENCH_USER))
+    history = [session_element(i, BENCH_USER) for i in range(main.WARMUP_SOURCE_ITEMS)]
+    on_deck = [session_element(i, BENCH_USER) for i in range(10000, 10000 + 30 * 48, 48) if i % 3 == 1]
+    books = [audiobook(i) for i in range(20000, 20030, 3)]
+    container = lambda elements: f"<MediaContainer size=\"{len(elements)}\">{''.join(elements)}</MediaContainer>".encode()
+    sections = "".join(f'<Directory key="{key}" title="{title}" type="{kind}"/>' for key, title, kind in (
+        (1, "Music", "artist"), (2, "TV Shows", "show"), (3, "Movies", "movie"), (4, "Audiobooks", "artist")))
+    routes = {"/accounts": f'<MediaContainer><Account id="7" name="{BENCH_USER}"/></MediaContainer>'.encode(),
+              "/status/sessions/history/all": container(history), "/library/onDeck": container(on_deck),
+              "/library/sections": f"<MediaContainer>{sections}</MediaContainer>".encode(),
+              "/library/sections/4/all": container(books)}
+    pool = history + on_deck + books
+    fresh = [session_element(i, BENCH_USER) for i in range(30000, 30000 + 5000)]
+    rng.shuffle(fresh)
+    return routes, pool, fresh
+
+
+def bench_warmup(args):
+    """Artwork ready on the first render of a newly started item, without and with the startup cache warm-up"""
+    prefetch_interval, main.PREFETCH_INTERVAL = main.PREFETCH_INTERVAL, 0  # Pacing only stretches the wall time
+    results = {}
+    try:
+        for warm in (False, True):
+            rng = random.Random(1)
+            routes, pool, fresh = warmup_library(rng)
+            now_playing = {"body": b"<MediaContainer/>"}
+            plex = StubPlex(dict(routes, **{"/status/sessions": lambda: now_playing["body"]}))
+            api = StubAPI()
+            config = {"realtime_updates": False, "audiobook_libraries": ["Audiobooks"], "cache_warmup": warm,
+                      "warmup_budget": args.budget}
+            with make_app(config, {"Bench": plex.url}, api.url) as app:
+                try:
+                    if not app.connect_plex(): sys.exit("Could not connect to the stub server")
+                    warmup_s = wait_for(lambda: app.warmup, 60) if warm else 0
+                    warmup_requests = api.requests()
+                    for play in range(args.plays):
+                        element = rng.choice(pool) if rng.random() < args.repeat_share else fresh[play]
+                        now_playing["body"] = f"<MediaContainer>{element}</MediaContainer>".encode()
+                        app.get_activity()
+                        wait_for(lambda: not app.fetcher.in_flight, 10)
+                    stats = app.cache.stats()
+                    results["warm" if warm else "cold"] = {
+                        "new_item_hit_rate": stats["new_item_hit_rate"], "warmup_hits": app.cache.new_item_warm_hits,
+                        "warmup_api_requests": warmup_requests, "playback_api_requests": api.requests() - warmup_requests,
+                        "warmup_s": round(warmup_s or 0, 2), "report": app.warmup or None}
+                finally:
+                    app.stop()
+                    plex.stop()
+                    api.stop()
+    finally:
+        main.PREFETCH_INTERVAL = prefetch_interval
+    results["hit_rate_gain"] = round(results["warm"]["new_item_hit_rate"] - results["cold"]["new_item_hit_rate"], 3)
+    for key, value in results.items(): print(f"{key:>14}: {value}")
+    if results["warm"]["warmup_api_requests"] > args.budget:
+        results["failed"] = f"Warm-up made {results['warm']['warmup_api_requests']} API requests, budget {args.budget}"
+    return results
+
+
+def write_replay_trace(path, cycles):
+    """Synthetic trace in the recorder's own format: a rotation of tracks, episodes and movies with pauses,
+    idle gaps and artwork arriving one cycle into each item"""
+    recorder = main.TraceRecorder(path, {"user_filter": BENCH_USER, "server_name": "Bench",
+                                         "audiobook_libraries": []})
+    polls_per_item, t = 240 // main.POLL_INTERVAL, 1_700_000_000.0
+    for poll in range(cycles):
+        slot, step = divmod(poll, polls_per_item)
+        item = None if slot % 10 == 9 else slot % 500
+        state = "paused" if item is not None and item % 7 == 0 and step >= polls_per_item // 2 else "playing"
+        sessions = main.parse_sessions(BytesIO(soak_payload(item, step * 15000, state)), BENCH_USER, "Bench")
+        recorder.cycle(t, sessions)
+        if sessions and step == 0:
+            cache_key = main.metadata_cache_key(*main.metadata_query(sessions[0], [])[:3])
+            recorder.metadata(t + 0.2, cache_key, {"found": True, "image": f"https://example.invalid/{item}.jpg",
+                                                    "url": f"https://example.invalid/{item}", "line1": f"Item {item}"})
+            recorder.patch(t + 0.2)
+        t += main.POLL_INTERVAL
+    recorder.close()
+    return t - 1_700_000_000.0
+
+
+def bench_replay(args):
+    """Trace replay: throughput flat out, determinism across runs, and the achieved speed-up when throttled"""
+    workdir = tempfile.mkdtemp()
+    path = args.trace
+    if not path:
+        path = os.path.join(workdir, "trace.jsonl")
+        write_replay_trace(path, args.cycles)
+    records = sum(1 for _ in main.read_trace(path))
+
+    started = time.perf_counter()
+    first = main.replay_trace(path)
+    flat_s = time.perf_counter() - started
+    second = main.replay_trace(path)
+
+    short = os.path.join(workdir, "short.jsonl")
+    simulated = write_replay_trace(short, 40)
+    started = time.perf_counter()
+    main.replay_trace(short, args.speed)
+    throttled_s = time.perf_counter() - started
+
+    results = {
+        "trace_records": records, "trace_kb": round(os.path.getsize(path) / 1024, 1), "payloads": len(first),
+        "clears": sum(1 for _, activity in first if activity is None),
+        "flat_out_s": round(flat_s, 2), "records_per_s": round(records / flat_s),
+        "simulated_speedup": round((first[-1][0] - first[0][0]) / flat_s) if len(first) > 1 else None,
+        "deterministic": first == second,
+        "throttled_speed": args.speed, "throttled_speedup": round(simulated / throttled_s),
+    }
+    for key, value in results.items(): print(f"{key:>18}: {value}")
+    if not results["deterministic"]: results["failed"] = "Two replays of the same trace sent different payloads"
+    return results
+
+
+class SlowLogHandler(logging.Handler):
+    """Log sink with a fixed write delay, standing in for a slow or busy disk"""
+
+    def __init__(self, delay):
+        super().__init__()
+        self.delay, self.lines = delay, []
+
+    def emit(self, record):
+        time.sleep(self.delay)
+        self.lines.append(self.format(record))
+
+
+def log_call_latency(handler, records):
+    logger = logging.Logger("bench")
+    logger.addHandler(handler)
+    samples = []
+    for i in range(records):
+        started = time.perf_counter()
+        logger.error("RPC Update Failed: [Errno 111] Connection refused") if i % 2 else logger.info(f"Update {i}")
+        samples.append((time.perf_counter() - started) * 1000)
+    samples.sort()
+    return {"median_ms": round(samples[len(samples) // 2], 4), "p99_ms": round(samples[int(len(samples) * 0.99)], 4),
+            "max_ms": round(samples[-1], 3)}
+
+
+def bench_logging(args):
+    """Caller-side cost of a log call when the disk is slow: direct handler vs. the queued pipeline"""
+    direct_sink = SlowLogHandler(args.disk_latency)
+    direct = log_call_latency(direct_sink, args.records)
+
+    queued_sink = SlowLogHandler(args.disk_latency)
+    pipeline = main.LogQueue(queue.Queue(main.LOG_QUEUE_SIZE))
+    writer = logging.handlers.QueueListener(pipeline.queue, queued_sink)
+    writer.start()
+    queued = log_call_latency(pipeline, args.records)
+    pipeline.flush_repeats()
+    writer.stop()
+
+    results = {
+        "disk_latency_ms": args.disk_latency * 1000, "records": args.records,
+        "direct": direct, "queued": queued, "lines_written_direct": len(direct_sink.lines),
+        "lines_written_queued": len(queued_sink.lines), "dropped": pipeline.dropped,
+        "summary": next((line for line in queued_sink.lines if "repeated" in line), None),
+    }
+    for key, value in results.items(): print(f"{key:>21}: {value}")
+    return results
+
+
+BENCHMARKS = {"sessions": bench_sessions, "reconnect": bench_reconnect, "http": bench_http, "startup": bench_startup,
+              "e2e": bench_e2e,
+              "wakeups": bench_wakeups, "servers": bench_servers,
+              "profiles": bench_profiles, "breakers": bench_breakers,
+              "scheduler": bench_scheduler, "soak": bench_soak,
+              "warmup": bench_warmup,
+              "replay": bench_replay, "logging": bench_logging}
+
+
+def main_cli():
+    parser = argparse.ArgumentParser(description="PlexRPC benchmarks")
+    parser.add_argument("benchmark", choices=sorted(BENCHMARKS))
+    parser.add_argument("--sizes", default="1,10,50,100,200", type=lambda v: [int(x) for x in v.split(",")])
+    parser.add_argument("--rounds", default=50, type=int)
+    parser.add_argument("--step", default=5.0, type=float, help="e2e: seconds between scripted playback changes")
+    parser.add_argument("--api-latency", default=0.2, type=float, help="e2e: metadata API delay in seconds")
+    parser.add_argument("--api-error-rate", default=0.1, type=float, help="e2e: share of metadata lookups failing")
+    parser.add_argument("--other-sessions", default=20, type=int, help="e2e: streams from other users on the server")
+    parser.add_argument("--no-websocket", action="store_true", help="e2e: poll only, no Plex notifications")
+    parser.add_argument("--engine", default="threaded", choices=("threaded", "async"),
+                        help="e2e/wakeups: presence loop to run")
+    parser.add_argument("--latencies", default="0.01,0.05,0.1,0.2", type=lambda v: [float(x) for x in v.split(",")],
+                        help="servers: per-server latency in seconds")
+    parser.add_argument("--outage", default=600.0, type=float, help="breakers: seconds the dependency stays down")
+    parser.add_argument("--threshold", default=1, type=int, help="breakers: failures in a row before it opens")
+    parser.add_argument("--idle", default=5.0, type=float, help="wakeups: seconds to count idle wakeups over")
+    parser.add_argument("--max-latency-ms", default=100.0, type=float,
+                        help="wakeups: slowest pause/unpause/quit allowed to reach the loop")
+    parser.add_argument("--weeks", default=2.0, type=float, help="soak: simulated playback time")
+    parser.add_argument("--items", default=3000, type=int, help="soak: distinct items played in rotation")
+    parser.add_argument("--cache-size", default=500, type=int, help="soak: metadata cache entries")
+    parser.add_argument("--max-growth-kb", default=256.0, type=float,
+                        help="soak: traced memory growth allowed over the second half of the run")
+    parser.add_argument("--max-updates-per-poll", default=0.25, type=float,
+                        help="soak: Discord updates allowed per poll while playback just moves on")
+    parser.add_argument("--plays", default=200, type=int, help="warmup: items started after the warm-up. scheduler: items played")
+    parser.add_argument("--repeat-share", default=0.5, type=float,
+                        help="warmup: share of those picked from history, On Deck and audiobooks")
+    parser.add_argument("--budget", default=main.WARMUP_BUDGET, type=int, help="warmup: warm-up API request budget")
+    parser.add_argument("--trace", help="e2e: record a playback trace to this file. replay: trace to replay instead "
+                                        "of a generated one")
+    parser.add_argument("--cycles", default=20000, type=int, help="replay: cycles in the generated trace")
+    parser.add_argument("--speed", default=main.REPLAY_SPEED, type=float, help="replay: throttled speed-up to check")
+    parser.add_argument("--records", default=2000, type=int, help="logging: log calls to time")
+    parser.add_argument("--disk-latency", default=0.002, type=float, help="logging: seconds each write takes")
+    parser.add_argument("--json", help="Write machine-readable results to this file")
+    args = parser.parse_args()
+
+    results = BENCHMARKS[args.benchmark](args)
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump({"benchmark": args.benchmark, "version": main.VERSION, "python": platform.python_version(),
+                       "platform": sys.platform, "timestamp": time.time(), "results": results}, f, indent=4)
+    if isinstance(results, dict) and results.get("failed"): sys.exit(results["failed"])
+
+
+if __name__ == "__main__":
+    main_cli()
@@ -5,21 +5,69 @@ import json
 import threading
 import webbrowser
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 import logging
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
+import queue
+import atexit
 import uuid
+import xml.etree.ElementTree as ET
 import ctypes
-import winreg
-from plexapi.myplex import MyPlexAccount
-from pypresence import Presence, ActivityType
-import pystray
-from PIL import Image, ImageTk, ImageDraw
-import tkinter as tk
-from tkinter import ttk, messagebox
+from collections import OrderedDict, deque
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from contextlib import nullcontext
+from bisect import bisect_left
+import argparse
+import signal
+import io
+import random
 
 # --- CONFIGURATION ---
 API_URL = "YOUR_API_URL_HERE"
 APP_NAME = "PlexRPC"
 VERSION = "2.3.0"
+POLL_INTERVAL = 15  # Seconds between session polls when no notification socket is available
+EVENT_POLL_INTERVAL = 60  # Safety-net poll while the Plex notification socket is alive
+MIN_POLL_INTERVAL = 2  # Floor for boundary wakeups so a stale viewOffset can't cause a busy loop
+MAX_IDLE_INTERVAL = 120  # Ceiling for the idle/paused backoff
+BOUNDARY_SLACK = 1.5  # Seconds past the predicted end of an item to poll for the next one
+SEEK_TOLERANCE = 5000  # ms of viewOffset drift treated as a seek rather than playback progress
+CACHE_MAX_ENTRIES = 2000
+CACHE_TTL = 7 * 24 * 3600  # Metadata API matches
+CACHE_NEGATIVE_TTL = 6 * 3600  # Lookups the API could not match
+CACHE_SAVE_INTERVAL = 60  # Minimum seconds between cache writes to disk
+METADATA_WORKERS = 2
+METADATA_TIMEOUT = 3  # Seconds a metadata API lookup may take
+PREFETCH_AHEAD = 3  # Upcoming tracks/episodes to warm the metadata cache for
+PREFETCH_INTERVAL = 2.0  # Minimum seconds between prefetch lookups
+WARMUP_BUDGET = 100  # Most metadata API requests one startup cache warm-up may make
+WARMUP_SOURCE_ITEMS = 50  # Items read from each warm-up source (history, On Deck, each audiobook library)
+WARMUP_YIELD = 0.5  # Seconds the warm-up waits while live or prefetch lookups are running
+RPC_BUDGET, RPC_WINDOW = 5, 20  # Discord accepts about 5 activity updates per 20 seconds
+TIMESTAMP_TOLERANCE = 10  # Seconds of start/end drift ignored, Plex only refreshes viewOffset every ~10s
+CACHED_CONNECT_TIMEOUT = 5  # A remembered server URI must answer quickly or we go back to plex.tv
+RACE_TIMEOUT = 15  # Overall budget for probing every candidate connection in parallel
+METRICS_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)  # Seconds
+METRICS_SUMMARY_INTERVAL = 3600
+HTTP_RETRIES = 2
+HTTP_BACKOFF = 0.5  # Retry delays grow as backoff * 2^n
+SERVER_WORKERS = 4  # Plex servers polled at once
+SETUP_WORKERS = 4  # Setup wizard lookups (servers, users, connections) running at once
+BREAKER_BASE_DELAY = 5  # First circuit breaker backoff, doubling (with jitter) on every failed probe
+BREAKER_MAX_DELAY = 300
+BREAKER_PROBE_TIMEOUT = 60  # A half-open probe that never reported back stops blocking the next one
+API_BREAKER_THRESHOLD = 3  # Metadata lookups in a row that must fail before the API counts as down
+TRAY_TITLE_LIMIT = 127  # Windows cuts tray tooltips off at 128 chars
+SHUTDOWN_TIMEOUT = 2  # How long stop() waits for the async engine to clear Discord
+SIGNAL_CHECK_INTERVAL = 0.2  # How often headless mode checks for a SIGINT/SIGTERM
+TRACE_VERSION = 1
+LOG_MAX_BYTES = 5 * 1024 * 1024
+LOG_MAX_AGE = 7 * 24 * 3600  # app.log is rotated weekly even when it stays small
+LOG_BACKUPS = 5  # Rotated logs kept next to app.log, oldest deleted first
+LOG_QUEUE_SIZE = 10000  # Records waiting on the writer thread before new ones get dropped
+LOG_REPEAT_INTERVAL = 3600  # Identical warnings/errors are logged once, then summarized once per interval
+REPLAY_SPEED = 1000  # Default replay speed-up over the recorded timeline, 0 runs as fast as possible
 
 
 # --- ASSET RESOURCE HELPER ---
@@ -36,24 +84,161 @@ APP_DIR = os.path.dirname(os.path.abspath(__file__))
 if getattr(sys, 'frozen', False):
     APP_DIR = os.path.dirname(sys.executable)
 
-CONFIG_DIR = os.path.join(os.getenv('APPDATA'), APP_NAME)
-CONFIG_FILE = os.path.join(CONFIG_DIR, 'config.json')
+# %APPDATA% on Windows, ~/.config elsewhere (headless boxes). PLEXRPC_DIR / PLEXRPC_CONFIG override both
+CONFIG_DIR = os.getenv('PLEXRPC_DIR') or os.path.join(os.getenv('APPDATA') or os.path.expanduser('~/.config'), APP_NAME)
+CONFIG_FILE = os.getenv('PLEXRPC_CONFIG') or os.path.join(CONFIG_DIR, 'config.json')
 LOG_FILE = os.path.join(CONFIG_DIR, 'app.log')
+CACHE_FILE = os.path.join(CONFIG_DIR, 'metadata_cache.json')
+CONNECTION_FILE = os.path.join(CONFIG_DIR, 'connection.json')
+REMOTE_CONFIG_FILE = os.path.join(CONFIG_DIR, 'remote_config.json')
 
 ICON_ICO = resource_path(os.path.join('assets', 'icon.ico'))
 ICON_PNG = resource_path(os.path.join('assets', 'icon.png'))
 
 # --- LOGGING SETUP ---
+class LogFile(RotatingFileHandler):
+    """app.log, rotated once it reaches LOG_MAX_BYTES or has been in use for LOG_MAX_AGE. Keeps the last LOG_BACKUPS
+    files as app.log.1 (newest) to app.log.N"""
+
+    def __init__(self, path, max_bytes=LOG_MAX_BYTES, max_age=LOG_MAX_AGE, backups=LOG_BACKUPS):
+        super().__init__(path, maxBytes=max_bytes, backupCount=backups, encoding='utf-8', delay=True)
+        self.max_age = max_age
+        # File times can't tell how old the log is (st_ctime is the last inode change on Linux, mtime the last
+        # write), so the age counts from the first record's own timestamp
+        self.started_at = self.first_record_time(path) or time.time()
+
+    @staticmethod
+    def first_record_time(path):
+        try:
+            with open(path, encoding='utf-8', errors='replace') as f:
+                line = f.readline()
+            stamp = line[10:29] if line.startswith('{"time": "') else line[:19]  # JSON or plain text format
+            return time.mktime(time.strptime(stamp, "%Y-%m-%d %H:%M:%S"))
+        except (OSError, ValueError):
+            return None
+
+    def shouldRollover(self, record):
+        if super().shouldRollover(record): return True
+        return self.stream is not None and self.stream.tell() > 0 and time.time() - self.started_at >= self.max_age
+
+    def doRollover(self):
+        super().doRollover()
+        self.started_at = time.time()
+
+
+class LogQueue(QueueHandler):
+    """Hands records to the writer thread without ever blocking the caller. Runs of identical warnings/errors are
+    folded: the first one goes through, the rest are counted and summarized as "repeated N×" once per interval"""
+
+    def __init__(self, log_queue, interval=LOG_REPEAT_INTERVAL, clock=time.monotonic):
+        super().__init__(log_queue)
+        self.interval, self.clock = interval, clock
+        self.repeats = {}  # (level, message) -> [window_started_at, suppressed, last suppressed record]
+        self.repeat_lock = threading.Lock()
+        self.dropped = 0
+
+    def emit(self, record):
+        if record.levelno >= logging.WARNING or self.repeats:
+            key, now = (record.levelno, record.getMessage()), self.clock()
+            with self.repeat_lock:
+                summaries = self.expire(now)
+                entry = self.repeats.get(key) if record.levelno >= logging.WARNING else None
+                if entry:
+                    entry[1], entry[2] = entry[1] + 1, record
+                    record = None
+                elif record.levelno >= logging.WARNING:
+                    self.repeats[key] = [now, 0, None]
+            for summary in summaries: super().emit(summary)
+            if record is None: return
+        super().emit(record)
+
+    def expire(self, now, everything=False):
+        """Summary records for windows that ran out, forgetting them so the next occurrence is logged in full"""
+        summaries = []
+        for key, (started, suppressed, last) in list(self.repeats.items()):
+            if not everything and now - started < self.interval: continue
+            del self.repeats[key]
+            if suppressed:
+                span = now - started
+                span = f"{span:.0f}s" if span < 120 else f"{span / 60:.0f} min"
+                last.msg, last.args = f"{last.getMessage()} (repeated {suppressed}× in {span})", None
+                last.repeated = suppressed
+                summaries.append(last)
+        return summaries
+
+    def flush_repeats(self):
+        with self.repeat_lock:
+            summaries = self.expire(self.clock(), everything=True)
+        for summary in summaries: super().emit(summary)
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1  # The disk can't keep up. Losing a line beats stalling the update loop
+
+
+class JsonLogFormatter(logging.Formatter):
+    """One JSON object per line, for log collectors"""
+
+    def format(self, record):
+        entry = {"time": self.formatTime(record), "level": record.levelname, "thread": record.threadName,
+                 "message": record.getMessage()}
+        if getattr(record, 'repeated', None): entry["repeated"] = record.repeated
+        return json.dumps(entry, ensure_ascii=False)
+
+
 if not os.path.exists(CONFIG_DIR): os.makedirs(CONFIG_DIR)
 
-if os.path.exists(LOG_FILE) and os.path.getsize(LOG_FILE) > 5 * 1024 * 1024:
-    try:
-        os.remove(LOG_FILE)
-    except Exception:
-        pass
+log_handlers = [LogFile(LOG_FILE), logging.StreamHandler(sys.stdout)]
+for handler in log_handlers:
+    handler.setFormatter(logging.Formatter('%(asctime)s - %(levelname)s - %(message)s'))
+log_queue = LogQueue(queue.Queue(LOG_QUEUE_SIZE))
+log_queue.setFormatter(logging.Formatter('%(message)s'))  # Only merges args/tracebacks, the writer adds the rest
+log_writer = QueueListener(log_queue.queue, *log_handlers)
+logging.basicConfig(level=logging.INFO, handlers=[log_queue])
+log_writer.start()
 
-log_handlers = [logging.FileHandler(LOG_FILE), logging.StreamHandler(sys.stdout)]
-logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s', handlers=log_handlers)
+
+def set_log_format(log_format):
+    """'json' switches the file and console output to JSON lines, anything else keeps the plain text format"""
+    if log_format != 'json': return
+    for handler in log_handlers: handler.setFormatter(JsonLogFormatter())
+
+
+def log_to_stderr():
+    """Console-only logging on stderr, leaving stdout and app.log alone (trace replay prints payloads to stdout)"""
+    console = logging.StreamHandler(sys.stderr)
+    console.setFormatter(log_handlers[1].formatter)
+    log_writer.handlers = (console,)
+
+
+@atexit.register
+def stop_logging():
+    """Writes out everything still queued. Call it before os._exit(), which skips atexit"""
+    if not log_writer._thread: return  # Already stopped
+    log_queue.flush_repeats()
+    log_writer.stop()  # Drains whatever is still queued
+
+
+def import_gui():
+    """Loads the Tk/PIL/pystray stack on first use so headless runs never pay for it"""
+    global tk, ttk, messagebox, Image, ImageTk, pystray
+    import tkinter as tk
+    from tkinter import ttk, messagebox
+    from PIL import Image, ImageTk
+    import pystray
+
+
+def import_aiohttp():
+    """aiohttp is optional: without it the threaded update loop is used. asyncio is only loaded for that engine too"""
+    global aiohttp, asyncio
+    import asyncio
+    try:
+        import aiohttp
+    except ImportError:
+        return False
+    return True
 
 
 def dark_title_bar(window):
@@ -70,6 +255,7 @@ def dark_title_bar(window):
 
 
 def set_startup(enable=True):
+    import winreg
     key_path = r"Software\Microsoft\Windows\CurrentVersion\Run"
     try:
         key = winreg.OpenKey(winreg.HKEY_CURRENT_USER, key_path, 0, winreg.KEY_ALL_ACCESS)
@@ -91,6 +277,7 @@ def set_startup(enable=True):
 
 def is_startup_enabled():
     try:
+        import winreg
         key = winreg.OpenKey(winreg.HKEY_CURRENT_USER, r"Software\Microsoft\Windows\CurrentVersion\Run", 0,
                              winreg.KEY_READ)
         winreg.QueryValueEx(key, APP_NAME)
@@ -100,45 +287,1249 @@ def is_startup_enabled():
         return False
 
 
-def fetch_config(client_uuid, app_version):
+# --- HTTP CLIENT ---
+class HttpClient:
+    """Keep-alive session with retry/backoff and default headers, tracking how often connections get reused"""
+
+    def __init__(self, headers=None, pool_size=4, retries=HTTP_RETRIES):
+        self.session = requests.Session()
+        self.session.headers.update(headers or {})
+        # Retry-After is ignored: honouring a long one would stall the caller (the update loop on a first-run
+        # fetch_config) far past the request timeout, the circuit breakers handle longer outages
+        retry = Retry(total=retries, backoff_factor=HTTP_BACKOFF, status_forcelist=(429, 500, 502, 503, 504),
+                      respect_retry_after_header=False)
+        adapter = HTTPAdapter(pool_connections=4, pool_maxsize=pool_size, max_retries=retry)
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
+
+    def get(self, url, **kwargs):
+        return self.session.get(url, **kwargs)
+
+    def post(self, url, **kwargs):
+        return self.session.post(url, **kwargs)
+
+    def stats(self):
+        requests_sent, connections = 0, 0
+        for adapter in set(self.session.adapters.values()):
+            pools = adapter.poolmanager.pools
+            for key in list(pools.keys()):
+                pool = pools.get(key)
+                if pool:
+                    requests_sent += pool.num_requests
+                    connections += pool.num_connections
+        return {"requests": requests_sent, "connections": connections, "reused": requests_sent - connections}
+
+    def close(self):
+        self.session.close()
+
+
+api_clients = {}
+
+
+def api_client(client_uuid):
+    """Shared pooled client for the PlexRPC API, one per client UUID"""
+    if client_uuid not in api_clients:
+        api_clients[client_uuid] = HttpClient({"X-Client-UUID": client_uuid, "X-App-Version": VERSION})
+    return api_clients[client_uuid]
+
+
+# --- METRICS ---
+class StageTimer:
+    __slots__ = ('metrics', 'stage', 'started')
+
+    def __init__(self, metrics, stage):
+        self.metrics, self.stage = metrics, stage
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.metrics.observe(self.stage, time.perf_counter() - self.started)
+
+
+NULL_TIMER = nullcontext()
+
+
+class Metrics:
+    """Per-stage latency histograms and event counters, exported as Prometheus text or JSON. Off by default"""
+
+    def __init__(self):
+        self.enabled = False
+        self.lock = threading.Lock()
+        self.stages, self.sums, self.counters = {}, {}, {}
+        self.collectors = {}  # name -> callable returning a dict of gauges (cache size, HTTP reuse, ...)
+        self.server = None
+        self.last_summary = time.monotonic()
+
+    def timer(self, stage):
+        return StageTimer(self, stage) if self.enabled else NULL_TIMER
+
+    def observe(self, stage, seconds):
+        with self.lock:
+            buckets = self.stages.setdefault(stage, [0] * (len(METRICS_BUCKETS) + 1))
+            buckets[bisect_left(METRICS_BUCKETS, seconds)] += 1
+            self.sums[stage] = self.sums.get(stage, 0.0) + seconds
+
+    def count(self, event, n=1):
+        if not self.enabled: return
+        with self.lock:
+            self.counters[event] = self.counters.get(event, 0) + n
+
+    def snapshot(self):
+        with self.lock:
+            stages = {}
+            for stage, buckets in self.stages.items():
+                cumulative, total = {}, 0
+                for le, n in zip(METRICS_BUCKETS + ('+Inf',), buckets):
+                    total += n
+                    cumulative[str(le)] = total
+                stages[stage] = {"count": total, "sum": round(self.sums[stage], 6), "buckets": cumulative}
+            counters = dict(self.counters)
+        gauges = {}
+        for name, collect in list(self.collectors.items()):
+            try:
+                gauges[name] = collect()
+            except Exception:
+                pass
+        return {"stages": stages, "counters": counters, "gauges": gauges}
+
+    def prometheus(self):
+        snap = self.snapshot()
+        lines = ["# TYPE plexrpc_stage_seconds histogram"]
+        for stage, hist in snap['stages'].items():
+            for le, n in hist['buckets'].items():
+                lines.append(f'plexrpc_stage_seconds_bucket{{stage="{stage}",le="{le}"}} {n}')
+            lines.append(f'plexrpc_stage_seconds_sum{{stage="{stage}"}} {hist["sum"]}')
+            lines.append(f'plexrpc_stage_seconds_count{{stage="{stage}"}} {hist["count"]}')
+        lines.append("# TYPE plexrpc_events_total counter")
+        for event, n in snap['counters'].items():
+            lines.append(f'plexrpc_events_total{{event="{event}"}} {n}')
+        # Samples per metric family, so each gets one TYPE line with all of its labelled series right below
+        families = {}
+        for group, values in snap['gauges'].items():
+            for key, value in values.items():
+                if isinstance(value, (int, float)):
+                    families.setdefault(f"plexrpc_{group}_{key}", []).append(("", value))
+                elif isinstance(value, dict):  # One labelled series per server/breaker
+                    label = key.replace('\\', '\\\\').replace('"', '\\"')
+                    for field, n in value.items():
+                        if isinstance(n, (int, float)):
+                            families.setdefault(f"plexrpc_{group}_{field}", []).append((f'{{name="{label}"}}', n))
+        for family, samples in families.items():
+            lines.append(f"# TYPE {family} gauge")
+            lines.extend(f"{family}{labels} {int(n) if isinstance(n, bool) else n}" for labels, n in samples)
+        return "\n".join(lines) + "\n"
+
+    def summary(self):
+        snap = self.snapshot()
+        stages = ", ".join(f"{stage} {h['count']}x avg {h['sum'] / h['count'] * 1000:.1f}ms"
+                           for stage, h in snap['stages'].items() if h['count'])
+        return f"{stages or 'no samples'} | {snap['counters']}"
+
+    def maybe_log_summary(self):
+        if not self.enabled or time.monotonic() - self.last_summary < METRICS_SUMMARY_INTERVAL: return
+        self.last_summary = time.monotonic()
+        logging.info(f"Metrics: {self.summary()}")
+
+    def serve(self, port):
+        """Serves /metrics (Prometheus text) and /metrics.json on localhost only"""
+        from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+        metrics = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path == '/metrics':
+                    body, content_type = metrics.prometheus().encode(), "text/plain; version=0.0.4"
+                elif self.path == '/metrics.json':
+                    body, content_type = json.dumps(metrics.snapshot()).encode(), "application/json"
+                else:
+                    self.send_error(404)
+                    return
+                self.send_response(200)
+                self.send_header("Content-Type", content_type)
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        try:
+            self.server = ThreadingHTTPServer(('127.0.0.1', port), Handler)
+            threading.Thread(target=self.server.serve_forever, daemon=True).start()
+            logging.info(f"Metrics available at http://127.0.0.1:{port}/metrics")
+        except Exception as e:
+            logging.error(f"Metrics Server Error: {e}")
+
+
+metrics = Metrics()
+
+
+# --- CIRCUIT BREAKERS ---
+class CircuitBreaker:
+    """Stops calling a dead dependency: opens after `threshold` failures in a row, waits out an exponential backoff
+    with jitter, then lets a single half-open probe decide whether to close again"""
+    CLOSED, OPEN, HALF_OPEN = 'closed', 'open', 'half-open'
+
+    def __init__(self, name, threshold=1, base_delay=BREAKER_BASE_DELAY, max_delay=BREAKER_MAX_DELAY,
+                 clock=time.monotonic, rng=random.random):
+        self.name, self.threshold, self.base_delay, self.max_delay = name, threshold, base_delay, max_delay
+        self.clock, self.rng = clock, rng
+        self.lock = threading.Lock()
+        self.state, self.failures, self.trips = self.CLOSED, 0, 0
+        self.retry_at, self.probe_at, self.last_error = 0, 0, None
+
+    def allow(self):
+        """True if a call may go ahead. The first caller after the backoff becomes the half-open probe"""
+        with self.lock:
+            if self.state == self.CLOSED: return True
+            now = self.clock()
+            if self.state == self.OPEN and now >= self.retry_at or \
+                    self.state == self.HALF_OPEN and now - self.probe_at > BREAKER_PROBE_TIMEOUT:
+                self.state, self.probe_at = self.HALF_OPEN, now
+                return True
+            return False
+
+    def success(self):
+        with self.lock:
+            if self.state != self.CLOSED: logging.info(f"{self.name} is back, closing its circuit breaker.")
+            self.state, self.failures, self.trips, self.last_error = self.CLOSED, 0, 0, None
+
+    def failure(self, error=None):
+        with self.lock:
+            self.failures += 1
+            self.last_error = str(error) if error is not None else None
+            if self.state != self.HALF_OPEN and self.failures < self.threshold: return
+            # Equal jitter: half the backoff is fixed, the other half random, so clients don't retry in lockstep
+            delay = min(self.max_delay, self.base_delay * 2 ** self.trips)
+            delay = delay / 2 + self.rng() * delay / 2
+            self.trips += 1
+            if self.state == self.CLOSED:
+                logging.error(f"{self.name} unavailable, pausing calls to it ({error})")
+                metrics.count('breaker_opened')
+            self.state, self.retry_at = self.OPEN, self.clock() + delay
+
+    def is_open(self):
+        return self.state != self.CLOSED
+
+    def retry_in(self):
+        return max(0.0, self.retry_at - self.clock()) if self.state == self.OPEN else 0.0
+
+    def describe(self):
+        if self.state == self.OPEN: return f"{self.name} down, retry in {self.retry_in():.0f}s"
+        if self.state == self.HALF_OPEN: return f"{self.name} retrying"
+        return f"{self.name} ok"
+
+    def stats(self):
+        return {"state": (self.CLOSED, self.HALF_OPEN, self.OPEN).index(self.state), "failures": self.failures,
+                "retry_in_s": round(self.retry_in(), 1)}
+
+
+breakers = {}
+
+
+def circuit(name, **kwargs):
+    """Shared breaker per dependency, created on first use"""
+    if name not in breakers:
+        breakers[name] = CircuitBreaker(name, **kwargs)
+    return breakers[name]
+
+
+def breaker_summary():
+    """Tray text for every dependency whose breaker isn't closed"""
+    return ", ".join(b.describe() for b in list(breakers.values()) if b.is_open())
+
+
+def load_remote_config():
+    """Last fetch_config result, so startup doesn't have to wait on the API"""
     try:
-        headers = {"X-Client-UUID": client_uuid, "X-App-Version": app_version}
-        res = requests.get(f"{API_URL}/api/config/discord-id", headers=headers, timeout=5)
+        with open(REMOTE_CONFIG_FILE, 'r') as f: return json.load(f)
+    except Exception:
+        return None
+
+
+def fetch_config(client_uuid, app_version, cached=None):
+    breaker = circuit("PlexRPC API", threshold=API_BREAKER_THRESHOLD)
+    if not breaker.allow(): return cached
+    try:
+        headers = {"X-App-Version": app_version}
+        if cached and cached.get('etag'): headers['If-None-Match'] = cached['etag']
+        if cached and cached.get('last_modified'): headers['If-Modified-Since'] = cached['last_modified']
+        res = api_client(client_uuid).get(f"{API_URL}/api/config/discord-id", headers=headers, timeout=5)
+        if res.status_code == 304 and cached:
+            breaker.success()
+            return cached
         res.raise_for_status()
         data = res.json()
-        return {"client_id": data.get('client_id'), "latest_version": data.get('latest_version', '0.0.0')}
+        breaker.success()
+        cfg = {"client_id": data.get('client_id'), "latest_version": data.get('latest_version', '0.0.0'),
+               "etag": res.headers.get('ETag'), "last_modified": res.headers.get('Last-Modified')}
+        try:
+            with open(REMOTE_CONFIG_FILE, 'w') as f: json.dump(cfg, f, indent=4)
+        except Exception as e:
+            logging.error(f"Failed to save remote config: {e}")
+        return cfg
     except Exception as e:
         logging.error(f"Failed to fetch config: {e}")
+        breaker.failure(e)
+        return None
+
+
+# --- SESSION PARSER ---
+SESSION_FIELDS = ('type', 'title', 'grandparentTitle', 'parentTitle', 'originalTitle', 'librarySectionTitle')
+SESSION_INT_FIELDS = ('ratingKey', 'parentRatingKey', 'grandparentRatingKey', 'index', 'parentIndex', 'viewOffset',
+                      'duration')
+
+
+class SessionSnapshot:
+    """Immutable copy of the session fields presence uses. Built once per poll so nothing keeps plexapi objects or
+    parsed XML alive between polls, and cheap to compare, hash and keep around"""
+    __slots__ = ('server_name', 'usernames', 'state') + SESSION_FIELDS + SESSION_INT_FIELDS
+
+    def __init__(self, server_name=None, usernames=(), state=None, **fields):
+        init = super().__setattr__
+        init('server_name', server_name)
+        init('usernames', tuple(usernames))
+        init('state', state)
+        for f in SESSION_FIELDS + SESSION_INT_FIELDS: init(f, fields.get(f))
+
+    @classmethod
+    def from_session(cls, session, server_name=None):
+        """Snapshot of a plexapi session, for the fast_sessions=False path"""
+        fields = {f: getattr(session, f, None) for f in SESSION_FIELDS + SESSION_INT_FIELDS}
+        fields['viewOffset'] = fields['viewOffset'] or 0
+        players = getattr(session, 'players', None)
+        return cls(server_name, session.usernames, players[0].state if players else None, **fields)
+
+    def __setattr__(self, name, value):
+        raise AttributeError(f"{type(self).__name__} is immutable")
+
+    def __delattr__(self, name):
+        raise AttributeError(f"{type(self).__name__} is immutable")
+
+    def values(self):
+        return tuple(getattr(self, f) for f in self.__slots__)
+
+    def __eq__(self, other):
+        return isinstance(other, SessionSnapshot) and self.values() == other.values()
+
+    def __hash__(self):
+        return hash(self.values())
+
+    def __repr__(self):
+        return f"SessionSnapshot({self.server_name!r}, {self.ratingKey!r}, {self.state!r}, {self.viewOffset!r})"
+
+    @property
+    def item_key(self):
+        return self.server_name, self.ratingKey
+
+    def shape(self):
+        """Everything but the position: a change here always needs a fresh presence"""
+        return tuple(getattr(self, f) for f in self.__slots__ if f != 'viewOffset')
+
+    def continues(self, prev, elapsed):
+        """True if this is `prev` `elapsed` seconds later with nothing but the clock moving the position"""
+        if prev is None or self.shape() != prev.shape(): return False
+        expected = prev.viewOffset + (elapsed * 1000 if self.state == 'playing' else 0)
+        return abs(self.viewOffset - expected) <= SEEK_TOLERANCE
+
+
+def parse_sessions(stream, usernames, server_name=None):
+    """Stream-parses a /status/sessions payload, only building snapshots of sessions that belong to `usernames`"""
+    if isinstance(usernames, str): usernames = [usernames]
+    wanted, matches = {u.lower() for u in usernames}, []
+    depth, users, state = 0, [], None
+    for event, elem in ET.iterparse(stream, events=('start', 'end')):
+        if event == 'start':
+            depth += 1
+            if depth == 2: users, state = [], None
+            continue
+        depth -= 1
+        if depth == 2:
+            if elem.tag == 'User':
+                users.append(elem.get('title', ''))
+            elif elem.tag == 'Player':
+                state = elem.get('state')
+        elif depth == 1:
+            if wanted.intersection(u.lower() for u in users):
+                fields = {f: elem.get(f) for f in SESSION_FIELDS}
+                fields.update({f: int(elem.get(f)) if elem.get(f) else None for f in SESSION_INT_FIELDS})
+                fields['viewOffset'] = fields['viewOffset'] or 0  # Same default plexapi uses
+                matches.append(SessionSnapshot(server_name, users, state, **fields))
+            elem.clear()  # Drop Media/Part/Stream children as soon as the session is done
+    return matches
+
+
+# --- METADATA CACHE ---
+def metadata_query(item, audiobook_libraries, section=None):
+    """Derives the metadata API lookup (type_, q, album_name, artist) for a Plex item"""
+    q, type_, album_name, artist = item.title, 'movie', None, None
+    section = getattr(item, 'librarySectionTitle', None) or section or ''
+    if item.type == 'episode':
+        q, type_ = item.grandparentTitle, 'tv'
+    elif item.type == 'track':
+        artist = item.originalTitle or item.grandparentTitle or "Unknown Artist"
+        album_name = getattr(item, 'parentTitle', '')  # Passed to the API separately
+        if section in audiobook_libraries or 'book' in section.lower():
+            q, type_ = f"{item.title} {artist}", 'book'
+        else:
+            # Only search Artist + Title to prevent confusing iTunes
+            q, type_ = f"{artist} {item.title}".strip(), 'music'
+    return type_, q, album_name, artist
+
+
+def warmup_report(counts, candidates):
+    counts["api_requests"] = counts["fetched"] + counts["failed"]
+    counts["coverage"] = round((counts["already_cached"] + counts["fetched"]) / candidates, 3) if candidates else 0.0
+    return counts
+
+
+def metadata_cache_key(type_, q, album_name):
+    # Add album to the cache key so different album versions of the same song don't collide
+    return type_, q, album_name if album_name else ''
+
+
+class MetadataCache:
+    """Bounded LRU cache of metadata API results, persisted to disk with a TTL per entry"""
+
+    def __init__(self, path=CACHE_FILE, max_entries=CACHE_MAX_ENTRIES, ttl=CACHE_TTL, negative_ttl=CACHE_NEGATIVE_TTL):
+        self.path, self.max_entries, self.ttl, self.negative_ttl = path, max_entries, ttl, negative_ttl
+        self.entries = None  # key -> (expires_at, value), loaded on first use
+        self.lock = threading.Lock()
+        self.hits, self.misses = 0, 0
+        self.dirty, self.last_save = False, 0
+        self.warmed = set()  # Keys the warm-up fetched that no new item has used yet
+        self.new_items, self.new_item_hits, self.new_item_warm_hits = 0, 0, 0
+
+    def _load(self):
+        self.entries = OrderedDict()
+        if not self.path: return  # In-memory only (trace replay)
+        try:
+            with open(self.path, 'r') as f:
+                now = time.time()
+                for key, expires_at, value in json.load(f):
+                    if expires_at > now: self.entries[tuple(key)] = (expires_at, value)
+            logging.info(f"Loaded {len(self.entries)} cached metadata entries.")
+        except FileNotFoundError:
+            pass
+        except Exception as e:
+            logging.error(f"Metadata Cache Load Error: {e}")
+
+    def get(self, key):
+        with self.lock:
+            if self.entries is None: self._load()
+            entry = self.entries.get(key)
+            if entry and entry[0] > time.time():
+                self.entries.move_to_end(key)
+                self.hits += 1
+                return entry[1]
+            if entry:
+                del self.entries[key]
+                self.dirty = True
+            self.misses += 1
+            return None
+
+    def note_new_item(self, key):
+        """Counts whether a newly started item's metadata was already cached, and whether the warm-up is why"""
+        with self.lock:
+            if self.entries is None: self._load()
+            entry = self.entries.get(key)
+            self.new_items += 1
+            if entry and entry[0] > time.time():
+                self.new_item_hits += 1
+                if key in self.warmed: self.new_item_warm_hits += 1
+            self.warmed.discard(key)
+
+    def mark_warmed(self, key):
+        with self.lock: self.warmed.add(key)
+
+    def contains(self, key):
+        """Checks for a live entry without touching the hit/miss counters or LRU order"""
+        with self.lock:
+            if self.entries is None: self._load()
+            entry = self.entries.get(key)
+            return bool(entry and entry[0] > time.time())
+
+    def put(self, key, value):
+        with self.lock:
+            if self.entries is None: self._load()
+            ttl = self.ttl if value.get('found') else self.negative_ttl
+            self.entries[key] = (time.time() + ttl, value)
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_entries: self.entries.popitem(last=False)
+            self.dirty = True
+        if time.time() - self.last_save > CACHE_SAVE_INTERVAL: self.save()
+
+    def save(self):
+        with self.lock:
+            if not self.dirty or self.entries is None or not self.path: return
+            data = [[list(k), e[0], e[1]] for k, e in self.entries.items()]
+            self.dirty, self.last_save = False, time.time()
+        try:
+            tmp_file = self.path + '.tmp'
+            with open(tmp_file, 'w') as f: json.dump(data, f)
+            os.replace(tmp_file, self.path)
+        except Exception as e:
+            logging.error(f"Metadata Cache Save Error: {e}")
+
+    def stats(self):
+        total = self.hits + self.misses
+        stats = {"entries": len(self.entries or ()), "hits": self.hits, "misses": self.misses,
+                 "hit_rate": round(self.hits / total, 3) if total else 0.0}
+        if self.new_items:  # How often a freshly started item had its artwork ready, with and without the warm-up
+            stats["new_item_hit_rate"] = round(self.new_item_hits / self.new_items, 3)
+            stats["new_item_hit_rate_without_warmup"] = round(
+                (self.new_item_hits - self.new_item_warm_hits) / self.new_items, 3)
+        return stats
+
+
+class MetadataLookups:
+    """What both fetchers share: which lookups run, in what order and how fast, and what gets cached. Subclasses
+    only supply the transport (a thread pool here, tasks on aiohttp for the async engine)"""
+
+    def __init__(self, cache, on_ready=None):
+        self.cache, self.on_ready = cache, on_ready
+        self.in_flight = {}  # cache_key -> whatever runs the lookup (None while it waits for its slot)
+        self.lock = threading.Lock()
+        self.next_prefetch_at = 0
+        self.breaker = circuit("PlexRPC API", threshold=API_BREAKER_THRESHOLD)
+        self.closed = False
+
+    def claim(self, cache_key, idle=False):
+        """Takes ownership of a lookup so nothing else starts it too. With idle, only while nothing else runs"""
+        with self.lock:
+            if cache_key in self.in_flight or (idle and self.in_flight): return False
+            self.in_flight[cache_key] = None
+            return True
+
+    def release(self, cache_key):
+        with self.lock: self.in_flight.pop(cache_key, None)
+
+    def pace(self):
+        """Reserves the next background lookup slot and returns how long to wait for it. Spaces lookups out so
+        binging an album doesn't burst the API"""
+        with self.lock:
+            now = time.time()
+            start = max(now, self.next_prefetch_at)
+            self.next_prefetch_at = start + PREFETCH_INTERVAL
+        return start - now
+
+    def prefetch_plan(self, cache_keys):
+        """(delay, cache_key) steps for run_plan(): uncached keys, already claimed, one slot apart"""
+        for cache_key in cache_keys:
+            if self.breaker.is_open(): return  # Live lookups get the probe, prefetching waits for recovery
+            if self.cache.contains(cache_key) or not self.claim(cache_key): continue
+            yield self.pace(), cache_key
+
+    def warm_plan(self, cache_keys, budget, counts):
+        """prefetch_plan() at the lowest priority: each lookup waits until nothing else is in flight, and at most
+        `budget` of them run. Tallies what happened to every key in counts"""
+        for cache_key in cache_keys:
+            if self.cache.contains(cache_key):
+                counts["already_cached"] += 1
+                continue
+            if budget <= 0 or self.closed or self.breaker.is_open():
+                counts["skipped"] += 1
+                continue
+            claimed = self.claim(cache_key, idle=True)
+            while not claimed and not self.closed:
+                yield WARMUP_YIELD, None  # Live lookups and prefetching first
+                claimed = self.claim(cache_key, idle=True)
+            if not claimed:
+                counts["skipped"] += 1
+                continue
+            if self.cache.contains(cache_key):  # A live lookup got it while we waited
+                self.release(cache_key)
+                counts["already_cached"] += 1
+                continue
+            budget -= 1
+            yield self.pace(), cache_key
+            if self.cache.contains(cache_key):
+                counts["fetched"] += 1
+                self.cache.mark_warmed(cache_key)
+            else:
+                counts["failed"] += 1
+
+    def warm(self, cache_keys, budget=WARMUP_BUDGET):
+        """Fills the cache ahead of time (see warm_plan). Blocks the calling thread, returns how much of
+        `cache_keys` ended up cached"""
+        counts = {"candidates": len(cache_keys), "already_cached": 0, "fetched": 0, "failed": 0, "skipped": 0}
+        self.run_warmup(self.warm_plan(cache_keys, budget, counts))
+        return warmup_report(counts, len(cache_keys))
+
+    def lookup_request(self, cache_key):
+        """(url, params) of the API call for a cache key"""
+        type_, q, album_name = cache_key
+        params = {'q': q}
+        if type_ == 'music' and album_name:
+            params['album'] = album_name
+        return f"{API_URL}/api/metadata/{type_}", params
+
+    def store(self, cache_key, res):
+        self.breaker.success()
+        # Misses are cached too (with a shorter TTL) so unmatched items stop re-hitting the API
+        self.cache.put(cache_key, res if res.get('found') else {"found": False})
+
+    def lookup_failed(self, error):
+        logging.error(f"Metadata Lookup Error: {error}")
+        self.breaker.failure(error)
+
+    def finish(self, cache_key, res):
+        self.release(cache_key)
+        if res is not None and self.on_ready: self.on_ready(cache_key)
+
+
+class MetadataFetcher(MetadataLookups):
+    """Runs metadata API lookups on a worker pool, coalescing duplicate requests for the same cache key"""
+
+    def __init__(self, cache, client_uuid, on_ready=None, workers=METADATA_WORKERS):
+        super().__init__(cache, on_ready)
+        self.client_uuid = client_uuid
+        self.pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="metadata")
+        self.prefetch_pool = ThreadPoolExecutor(max_workers=1, thread_name_prefix="prefetch")
+
+    def request(self, cache_key):
+        if not self.claim(cache_key): return False
+        try:
+            self.pool.submit(self._fetch, cache_key)
+        except RuntimeError:  # Pool already shut down
+            self.release(cache_key)
+            return False
+        return True
+
+    def prefetch(self, list_keys, *args):
+        """Warms the cache on a separate low-priority thread so live lookups never queue behind it"""
+        try:
+            self.prefetch_pool.submit(self._prefetch, list_keys, *args)
+        except RuntimeError:
+            pass
+
+    def _prefetch(self, list_keys, *args):
+        try:
+            keys = list_keys(*args)
+        except Exception as e:
+            logging.error(f"Prefetch Error: {e}")
+            return
+        self.run_plan(self.prefetch_plan(keys))
+
+    def run_plan(self, plan):
+        for delay, cache_key in plan:
+            if delay > 0: time.sleep(delay)
+            if cache_key: self._fetch(cache_key)
+
+    def run_warmup(self, plan):
+        self.run_plan(plan)
+
+    def _fetch(self, cache_key):
+        res = None
+        try:
+            if not self.breaker.allow(): return  # API is down, the item shows without artwork for now
+            url, params = self.lookup_request(cache_key)
+            with metrics.timer('metadata_fetch'):
+                r = api_client(self.client_uuid).get(url, params=params, timeout=METADATA_TIMEOUT)
+                if r.status_code >= 500: r.raise_for_status()
+                res = r.json()
+            self.store(cache_key, res)
+        except Exception as e:
+            self.lookup_failed(e)
+            res = None
+        finally:
+            self.finish(cache_key, res)
+
+    def shutdown(self):
+        self.closed = True
+        self.pool.shutdown(wait=False, cancel_futures=True)
+        self.prefetch_pool.shutdown(wait=False, cancel_futures=True)
+
+
+# --- POLL SCHEDULER ---
+class VirtualClock:
+    """Manually advanced stand-in for time.monotonic, for driving schedulers without waiting"""
+
+    def __init__(self, start=0.0):
+        self.now = start
+
+    def __call__(self):
+        return self.now
+
+    def advance(self, seconds):
+        self.now += seconds
+
+
+class PollScheduler:
+    """Picks the next poll delay from playback state: wakes near the end of the item, backs off while idle or paused"""
+
+    def __init__(self, clock=time.monotonic, max_idle=MAX_IDLE_INTERVAL):
+        self.clock, self.max_idle = clock, max_idle
+        self.idle_polls = 0
+        self.boundary_at = None
+
+    def observe(self, state, view_offset=None, duration=None):
+        """Records a poll result. state is 'playing', 'paused' or None when nothing is playing"""
+        self.boundary_at = None
+        if state != 'playing':
+            self.idle_polls += 1
+            return
+        self.idle_polls = 0
+        if view_offset is not None and duration:
+            remaining = (duration - view_offset) / 1000
+            if remaining > 0: self.boundary_at = self.clock() + remaining
+
+    def activity(self):
+        """Snaps back to fast polling, e.g. after a Plex notification"""
+        self.idle_polls = 0
+
+    def next_delay(self, interval):
+        if self.idle_polls:
+            return min(interval * 2 ** (self.idle_polls - 1), max(interval, self.max_idle))
+        if self.boundary_at is not None:
+            until_boundary = self.boundary_at - self.clock() + BOUNDARY_SLACK
+            return max(MIN_POLL_INTERVAL, min(interval, until_boundary))
+        return interval
+
+
+# --- DISCORD PUBLISHER ---
+class RPCPublisher:
+    """Sends presence to Discord only when it meaningfully changed, within Discord's update rate budget"""
+
+    def __init__(self, clock=time.monotonic, budget=RPC_BUDGET, window=RPC_WINDOW):
+        self.clock, self.budget, self.window = clock, budget, window
+        self.lock = threading.Lock()
+        self.sent_at = deque()
+        self.last = None  # Payload currently shown on Discord
+        self.shown = False  # Whether Discord may be showing anything we sent
+        self.pending = None  # Latest payload held back by the rate budget
+        self.sent, self.suppressed, self.deferred, self.clears = 0, 0, 0, 0
+
+    def reset(self):
+        """Forgets what Discord shows, e.g. after (re)connecting"""
+        with self.lock:
+            self.last, self.shown, self.pending = None, False, None
+
+    def unchanged(self, activity):
+        if self.last is None: return False
+        for key in (set(activity) | set(self.last)) - {'start', 'end'}:
+            if activity.get(key) != self.last.get(key): return False
+        for key in ('start', 'end'):
+            new, old = activity.get(key), self.last.get(key)
+            if (new is None) != (old is None): return False
+            if new is not None and abs(new - old) > TIMESTAMP_TOLERANCE: return False
+        return True
+
+    def _prune(self):
+        now = self.clock()
+        while self.sent_at and now - self.sent_at[0] >= self.window: self.sent_at.popleft()
+        return now
+
+    def publish(self, rpc, activity):
+        if not self.should_send(activity): return False
+        with metrics.timer('rpc_update'):
+            rpc.update(**activity)
+        self.mark_sent(activity)
+        return True
+
+    async def publish_async(self, rpc, activity):
+        """publish() for pypresence's AioPresence"""
+        if not self.should_send(activity): return False
+        with metrics.timer('rpc_update'):
+            await rpc.update(**activity)
+        self.mark_sent(activity)
+        return True
+
+    def should_send(self, activity):
+        with self.lock:
+            if self.unchanged(activity):
+                self.pending = None
+                self.suppressed += 1
+                return False
+            self._prune()
+            if len(self.sent_at) >= self.budget:
+                self.pending = activity  # Only the latest state survives a burst
+                self.deferred += 1
+                return False
+            return True
+
+    def mark_sent(self, activity):
+        with self.lock:
+            self.sent_at.append(self.clock())
+            self.last, self.shown, self.pending = activity, True, None
+            self.sent += 1
+
+    def clear(self, rpc):
+        """Clears once per transition. Never deferred, hiding presence matters more than the budget"""
+        if not self.should_clear(): return False
+        rpc.clear()
+        self.mark_cleared()
+        return True
+
+    async def clear_async(self, rpc):
+        if not self.should_clear(): return False
+        await rpc.clear()
+        self.mark_cleared()
+        return True
+
+    def wipe(self, rpc):
+        """Quitting: clears the status immediately, whatever the publisher thinks Discord shows"""
+        self.reset()
+        try:
+            rpc.clear()
+        except Exception:
+            pass
+
+    async def wipe_async(self, rpc):
+        self.reset()
+        try:
+            await asyncio.wait_for(rpc.clear(), SHUTDOWN_TIMEOUT)
+        except Exception:
+            pass
+
+    def should_clear(self):
+        with self.lock:
+            self.pending = None
+            if not self.shown: self.suppressed += 1
+            return self.shown
+
+    def mark_cleared(self):
+        with self.lock:
+            self.sent_at.append(self._prune())
+            self.last, self.shown = None, False
+            self.clears += 1
+
+    def flush_delay(self):
+        """Seconds until a held-back update fits the budget, or None if nothing is waiting"""
+        with self.lock:
+            if self.pending is None: return None
+            now = self._prune()
+            return 0 if len(self.sent_at) < self.budget else self.sent_at[0] + self.window - now
+
+    def stats(self):
+        return {"sent": self.sent, "suppressed": self.suppressed, "deferred": self.deferred, "clears": self.clears}
+
+
+class ActivityFile:
+    """Presence target that writes the current activity to a JSON file instead of Discord"""
+
+    def __init__(self, path):
+        self.path = path
+
+    def update(self, **activity):
+        self._write(activity)
+
+    def clear(self):
+        self._write(None)
+
+    def close(self):
+        pass
+
+    def _write(self, activity):
+        tmp = self.path + '.tmp'
+        with open(tmp, 'w') as f:
+            json.dump(activity, f, indent=4, default=lambda v: getattr(v, 'name', str(v)))  # ActivityType
+        os.replace(tmp, self.path)
+
+
+class ProfileSink:
+    """Presence output for one extra profile: its Plex user shown through its own Discord client ID/pipe or a file"""
+
+    def __init__(self, profile):
+        self.user_filter = profile['user_filter']
+        self.client_id, self.pipe, self.output = profile.get('client_id'), profile.get('pipe'), profile.get('output')
+        self.rpc, self.pending_meta, self.last_activity_log, self.last_render = None, None, None, None
+        # Files have no rate limit, only the diffing matters
+        self.publisher = RPCPublisher(budget=sys.maxsize) if self.output else RPCPublisher()
+        self.breaker = None if self.output else circuit(f"Discord ({self.user_filter})")
+
+    def connect(self, default_client_id):
+        if self.output:
+            self.rpc = ActivityFile(self.output)
+        else:
+            client_id = self.client_id or default_client_id
+            if not client_id or not self.breaker.allow(): return False
+            try:
+                from pypresence import Presence
+                rpc = Presence(client_id, pipe=self.pipe)
+                rpc.connect()
+            except Exception as e:
+                logging.error(f"Discord RPC Error ({self.user_filter}): {e}")
+                self.breaker.failure(e)
+                return False
+            self.rpc = rpc
+            self.breaker.success()
+            logging.info(f"Connected profile {self.user_filter} to Discord RPC (ID: {client_id}).")
+        self.publisher.reset()
+        return True
+
+    def publish(self, activity, default_client_id):
+        if not self.rpc and not self.connect(default_client_id): return
+        try:
+            if activity:
+                current_signature = (activity.get('details'), activity.get('state'))
+                if current_signature != self.last_activity_log:
+                    logging.info(f"Update ({self.user_filter}): {activity.get('details')} - {activity.get('state')}")
+                    self.last_activity_log = current_signature
+                self.publisher.publish(self.rpc, activity)
+            else:
+                self.last_activity_log = None
+                self.publisher.clear(self.rpc)
+        except Exception as e:
+            logging.error(f"RPC Update Failed ({self.user_filter}): {e}")
+            if self.breaker: self.breaker.failure(e)
+            self.rpc = None
+            self.publisher.reset()
+
+    def close(self):
+        if not self.rpc: return
+        try:
+            self.rpc.clear()
+            self.rpc.close()
+        except Exception:
+            pass
+        self.rpc = None
+
+
+def usable_profile(profile):
+    """Profiles need their own Discord pipe or an output file, on the default pipe they'd overwrite the main presence"""
+    if profile.get('output') or profile.get('pipe'): return True
+    logging.error(f"Ignoring profile {profile.get('user_filter')}: set a 'pipe' other than 0 or an 'output' file")
+    return False
+
+
+# --- SERVER CONNECTION ---
+connection_lock = threading.Lock()
+
+
+def load_connection_cache():
+    try:
+        with open(CONNECTION_FILE, 'r') as f: return json.load(f)
+    except Exception:
+        return {}
+
+
+def save_connection(server_name, server):
+    """Remembers the URI and token that worked so the next reconnect can skip plex.tv"""
+    with connection_lock:  # Servers can reconnect concurrently
+        data = load_connection_cache()
+        data[server_name] = {"uri": server._baseurl, "token": server._token, "machine_id": server.machineIdentifier}
+        try:
+            with open(CONNECTION_FILE, 'w') as f: json.dump(data, f, indent=4)
+        except Exception as e:
+            logging.error(f"Failed to save connection cache: {e}")
+
+
+def after_probe(server):
+    """Puts plexapi's normal request timeout back on a server that was reached with a short probe timeout"""
+    from plexapi import TIMEOUT
+    server._timeout = TIMEOUT
+    return server
+
+
+def connect_cached(server_name, session, timeout=CACHED_CONNECT_TIMEOUT):
+    from plexapi.server import PlexServer
+    cached = load_connection_cache().get(server_name)
+    if not cached: return None
+    try:
+        server = PlexServer(cached['uri'], cached['token'], session=session, timeout=timeout)
+        if server.machineIdentifier != cached.get('machine_id'):
+            raise ConnectionError("a different server answers at this address now")
+        return after_probe(server)
+    except Exception as e:
+        logging.info(f"Cached Plex connection failed ({e}), asking plex.tv...")
         return None
 
 
+def race_connections(resource, session, timeout=RACE_TIMEOUT):
+    """Probes every candidate connection (local, remote, relay) at once and returns the first healthy server"""
+    from plexapi.server import PlexServer
+    urls = resource.preferred_connections()
+    if not urls: raise ConnectionError(f"{resource.name} has no published connections")
+    pool = ThreadPoolExecutor(max_workers=len(urls), thread_name_prefix="connect")
+    futures = {pool.submit(PlexServer, url, resource.accessToken, session, timeout): url for url in urls}
+    try:
+        for future in as_completed(futures, timeout=timeout):
+            try:
+                return after_probe(future.result())
+            except Exception as e:
+                logging.info(f"Plex connection {futures[future]} failed: {e}")
+    finally:
+        pool.shutdown(wait=False, cancel_futures=True)
+    raise ConnectionError(f"None of the {len(urls)} connections to {resource.name} answered")
+
+
+class PlexServerLink:
+    """Connection, notification socket and health of one configured Plex server"""
+
+    def __init__(self, name, auth_token, session):
+        self.name, self.auth_token, self.session = name, auth_token, session
+        self.plex = None
+        self.alert_listener, self.alert_retry_at = None, 0
+        self.connecting = False
+        self.breaker = circuit(f"Plex ({name})")
+        self.latency, self.failures, self.error = None, 0, None
+
+    def connect(self):
+        try:
+            started = time.time()
+            self.plex, route = connect_cached(self.name, self.session), "cached"
+            if not self.plex:
+                from plexapi.myplex import MyPlexAccount
+                account = MyPlexAccount(token=self.auth_token, session=self.session)
+                self.plex, route = race_connections(account.resource(self.name), self.session), "plex.tv"
+                save_connection(self.name, self.plex)
+            logging.info(f"Connected to Plex Server: {self.name} at {self.plex._baseurl} "
+                         f"({route}, {(time.time() - started) * 1000:.0f} ms)")
+            self.breaker.success()
+            self.error, self.alert_retry_at = None, 0
+            return True
+        except Exception as e:
+            logging.error(f"Plex Connection Error ({self.name}): {e}")
+            self.mark_down(e)
+            return False
+
+    def adopt(self, server):
+        """Takes over a connection made elsewhere (the setup wizard) instead of connecting again"""
+        self.plex, self.error = server, None
+        self.breaker.success()
+        logging.info(f"Connected to Plex Server: {self.name} at {server._baseurl} (setup)")
+
+    def mark_down(self, error):
+        """Drops the connection and lets the breaker back off before the next reconnect attempt"""
+        self.plex, self.error = None, str(error)
+        self.failures += 1
+        self.breaker.failure(error)
+
+    def failed(self, error, disconnected=False):
+        logging.error(f"Plex Sessions Error ({self.name}): {error}")
+        if disconnected or isinstance(error, requests.exceptions.ConnectionError):
+            self.mark_down(error)  # Server went away, reconnect in the background
+        else:
+            self.error = str(error)
+            self.failures += 1
+
+    def due(self):
+        """Whether to reconnect now. Claims the breaker's half-open probe, so only call it right before connecting"""
+        return not self.plex and not self.connecting and self.breaker.allow()
+
+    def fetch_sessions(self, usernames, fast=True):
+        """Sessions for `usernames`, skipping plexapi's object building for everyone else's streams"""
+        started = time.time()
+        sessions = None
+        if fast:
+            try:
+                res = self.plex._session.get(self.plex.url('/status/sessions'), headers=self.plex._headers(),
+                                             timeout=self.plex._timeout, stream=True)
+                try:
+                    res.raise_for_status()
+                    res.raw.decode_content = True
+                    sessions = parse_sessions(res.raw, usernames, self.name)
+                finally:
+                    res.close()
+            except requests.exceptions.ConnectionError:
+                raise
+            except Exception as e:
+                logging.error(f"Fast session parse failed, using plexapi: {e}")
+        if sessions is None:
+            wanted = {u.lower() for u in usernames}
+            sessions = [SessionSnapshot.from_session(s, self.name) for s in self.plex.sessions()
+                        if wanted.intersection(u.lower() for u in s.usernames)]
+        return self.fetched(sessions, time.time() - started)
+
+    def fetched(self, sessions, latency):
+        self.latency, self.error = latency, None
+        return sessions
+
+    def start_alert_listener(self, callback, callback_error):
+        if time.time() < self.alert_retry_at: return
+        self.alert_retry_at = time.time() + EVENT_POLL_INTERVAL
+        try:
+            self.alert_listener = self.plex.startAlertListener(callback=callback, callbackError=callback_error)
+            logging.info(f"Listening for Plex playback notifications from {self.name}.")
+        except Exception as e:
+            logging.error(f"Plex Notification Error ({self.name}): {e}")
+            self.alert_listener = None
+
+    def alerts_alive(self):
+        return self.alert_listener is not None and self.alert_listener.is_alive()
+
+    def stop_alert_listener(self):
+        if self.alerts_alive():
+            try:
+                self.alert_listener.stop()
+            except:
+                pass
+
+    def stats(self):
+        return {"connected": self.plex is not None, "notifications": self.alerts_alive(),
+                "latency_ms": round(self.latency * 1000, 1) if self.latency is not None else None,
+                "failures": self.failures, "error": self.error}
+
+    def describe(self):
+        if not self.plex:
+            retry = f", retry in {self.breaker.retry_in():.0f}s" if self.breaker.retry_in() >= 1 else ""
+            return f"{self.name}: down ({(self.error or 'connecting')[:60]}){retry}"
+        if self.error: return f"{self.name}: error ({self.error[:60]})"
+        return f"{self.name}: {'live' if self.alerts_alive() else 'polling'}"
+
+
+# --- TRACE RECORDER ---
+class TraceRecorder:
+    """Opt-in append-only JSON lines log of what every presence cycle saw, compact enough to leave on for days.
+    After a header line, each cycle is one record, preceded by any metadata it was the first to use:
+        [t, "s", [[field, ...], ...]]   sessions (SessionSnapshot fields, see the header), [t, "s"] if unchanged
+        [t, "o", [offset, ...]]         same sessions as the last "s", only their viewOffsets moved
+        [t, "e", error]                 the sessions fetch failed
+        [t, "p"]                        artwork arrived for the item on screen and was patched in
+        [t, "m", cache_key, result]     a metadata result, first time it was used or when it changed"""
+
+    def __init__(self, path, config):
+        self.lock = threading.Lock()
+        self.last_rows, self.last_shapes, self.seen_metadata = None, None, {}
+        self.file = open(path, 'a', encoding='utf-8')
+        replay_config = {k: config[k] for k in ('user_filter', 'audiobook_libraries', 'servers', 'server_name')
+                         if k in config}
+        self.write({"trace": TRACE_VERSION, "version": VERSION, "fields": SessionSnapshot.__slots__,
+                    "config": replay_config})
+
+    def write(self, record):
+        line = json.dumps(record, separators=(',', ':'), default=str) + '\n'
+        with self.lock:
+            if self.file.closed: return
+            self.file.write(line)
+            self.file.flush()
+
+    def cycle(self, t, sessions, error=None):
+        if sessions is None:
+            self.write([round(t, 3), "e", str(error)])
+            return
+        rows = [s.values() for s in sessions]
+        if rows == self.last_rows:
+            self.write([round(t, 3), "s"])
+        elif self.last_rows and [s.shape() for s in sessions] == self.last_shapes:
+            self.last_rows = rows
+            self.write([round(t, 3), "o", [s.viewOffset for s in sessions]])
+        else:
+            self.last_rows, self.last_shapes = rows, [s.shape() for s in sessions]
+            self.write([round(t, 3), "s", rows])
+
+    def patch(self, t):
+        self.write([round(t, 3), "p"])
+
+    def metadata(self, t, cache_key, res):
+        if self.seen_metadata.get(cache_key) == res: return
+        self.seen_metadata[cache_key] = res
+        self.write([round(t, 3), "m", cache_key, res])
+
+    def close(self):
+        with self.lock: self.file.close()
+
+
+def read_trace(path):
+    with open(path, 'r', encoding='utf-8') as f:
+        for line in f:
+            if line.strip(): yield json.loads(line)
+
+
+class ReplayRPC:
+    """Discord stand-in for trace replay: keeps every payload that would have been sent, with its virtual time"""
+
+    def __init__(self, clock):
+        self.clock, self.payloads = clock, []
+
+    def update(self, **activity):
+        self.payloads.append((self.clock(), activity))
+
+    def clear(self):
+        self.payloads.append((self.clock(), None))
+
+
+def replay_app(config, clock):
+    """A PlexPresence that never touches the network: in-memory cache, no metadata fetches, virtual time"""
+    app = PlexPresence(headless=True, config=dict(config, auth_token='', client_uuid='replay'))
+    app.fetcher.shutdown()  # Lookups are dropped, metadata comes from the trace's "m" records instead
+    app.cache = MetadataCache(None)
+    app.clock, app.scheduler, app.publisher = clock, PollScheduler(clock=clock), RPCPublisher(clock=clock)
+    app.rpc = ReplayRPC(clock)
+    return app
+
+
+def replay_trace(path, speed=0):
+    """Feeds a recorded trace back through get_activity and the Discord publisher on a virtual clock.
+    Returns the (t, activity or None for a clear) payloads in the order Discord would have received them.
+    `speed` replays that many times faster than recorded, 0 runs flat out"""
+    clock, app, fields, payloads, rows = VirtualClock(), None, None, [], []
+    started, last_t = time.perf_counter(), None
+    for record in read_trace(path):
+        if isinstance(record, dict):  # Header: the app (re)started, Discord starts from a blank slate
+            if app: payloads += app.rpc.payloads
+            fields, rows, last_t = record['fields'], [], None
+            app = replay_app(record['config'], clock)
+            continue
+        t, kind = record[0], record[1]
+        if speed and last_t is not None and t > last_t:
+            time.sleep((t - last_t) / speed)
+        clock.now, last_t = t, t
+        if kind == 'm':
+            app.cache.put(tuple(record[2]), record[3])
+            continue
+        if kind in ('s', 'o'):
+            if kind == 'o':
+                offset = fields.index('viewOffset')
+                rows = [row[:offset] + [value] + row[offset + 1:] for row, value in zip(rows, record[2])]
+            elif len(record) > 2:
+                rows = record[2]
+            activity = app.get_activity([SessionSnapshot(**dict(zip(fields, row))) for row in rows])
+        elif kind == 'p':
+            activity = app.patch_activity() if app.pending_meta else None
+        else:
+            activity = app.activity_failed(record[2])
+        if activity:
+            app.publisher.publish(app.rpc, activity)
+        else:
+            app.publisher.clear(app.rpc)
+    if app: payloads += app.rpc.payloads
+    logging.info(f"Replayed {path}: {len(payloads)} payloads in {time.perf_counter() - started:.2f}s")
+    return payloads
+
+
 # --- DYNAMIC TRAY ICON GENERATOR ---
+STATUS_COLORS = {
+    "green": (35, 165, 89, 255),  # Playing
+    "blue": (88, 101, 242, 255),  # Paused
+    "orange": (250, 166, 26, 255),  # Idle
+    "red": (237, 66, 69, 255),  # Error
+    "yellow": (254, 231, 92, 255),  # Warning
+    "grey": (153, 170, 181, 255)  # Paused/Ghost Mode
+}
+status_icons = {}  # (base_icon_path, color) -> rendered image
+
+
+def render_status_icons(base_icon_path):
+    """Composites every status variant in one go, from a single decode of the base icon"""
+    from PIL import Image, ImageDraw
+    base = Image.open(base_icon_path).convert("RGBA")
+    w, h = base.size
+    dot_size = int(w * 0.35)
+    x0, y0 = w - dot_size, h - dot_size
+    for name, color in list(STATUS_COLORS.items()) + [(None, (128, 128, 128, 255))]:
+        overlay = Image.new('RGBA', base.size, (0, 0, 0, 0))
+        ImageDraw.Draw(overlay).ellipse((x0, y0, w, h), fill=color, outline=(0, 0, 0, 255), width=2)
+        status_icons[(base_icon_path, name)] = Image.alpha_composite(base, overlay)
+
+
 def create_status_icon(base_icon_path, status_color):
     try:
-        base = Image.open(base_icon_path).convert("RGBA")
-        colors = {
-            "green": (35, 165, 89, 255),  # Playing
-            "blue": (88, 101, 242, 255),  # Paused
-            "orange": (250, 166, 26, 255),  # Idle
-            "red": (237, 66, 69, 255),  # Error
-            "yellow": (254, 231, 92, 255),  # Warning
-            "grey": (153, 170, 181, 255)  # Paused/Ghost Mode
-        }
-        color = colors.get(status_color, (128, 128, 128, 255))
-        overlay = Image.new('RGBA', base.size, (0, 0, 0, 0))
-        draw = ImageDraw.Draw(overlay)
-        w, h = base.size
-        dot_size = int(w * 0.35)
-        x0, y0 = w - dot_size, h - dot_size
-        draw.ellipse((x0, y0, w, h), fill=color, outline=(0, 0, 0, 255), width=2)
-        return Image.alpha_composite(base, overlay)
+        if (base_icon_path, None) not in status_icons: render_status_icons(base_icon_path)
+        status_color = status_color if status_color in STATUS_COLORS else None
+        return status_icons[(base_icon_path, status_color)]
     except Exception as e:
+        from PIL import Image
         logging.error(f"Icon Gen Error: {e}")
         return Image.open(base_icon_path)
 
 
 class SetupWizard:
     def __init__(self):
+        import_gui()
         self.root = tk.Tk()
         self.root.title(f"{APP_NAME} Setup")
         self.root.geometry("500x550")
@@ -154,6 +1545,16 @@ class SetupWizard:
         style.map("TButton", background=[('active', self.accent_color)])
         if os.path.exists(ICON_ICO): self.root.iconbitmap(ICON_ICO)
         self.account, self.servers, self.client_identifier = None, [], str(uuid.uuid4())
+        self.http = HttpClient({'X-Plex-Product': APP_NAME, 'X-Plex-Client-Identifier': self.client_identifier,
+                                'Accept': 'application/json'})
+        # Discovery runs here while the user is still picking, PlexPresence takes the session and connection over
+        self.plex_http = HttpClient(pool_size=8, retries=0)
+        self.pool = ThreadPoolExecutor(max_workers=SETUP_WORKERS, thread_name_prefix="setup")
+        self.users_future, self.servers_future = None, None
+        self.connections = {}  # server name -> future of (PlexServer, library sections)
+        self.connections_lock = threading.Lock()  # Filled from the discovery workers and the Tk thread
+        self.handoff = None  # (plex_http, {server name: PlexServer}) once setup finished
+        self.root.protocol("WM_DELETE_WINDOW", self.close)
         self.build_ui()
 
     def build_ui(self):
@@ -180,20 +1581,20 @@ class SetupWizard:
 
         def oauth_thread():
             try:
-                headers = {'X-Plex-Product': APP_NAME, 'X-Plex-Client-Identifier': self.client_identifier,
-                           'Accept': 'application/json'}
-                res = requests.post("https://plex.tv/api/v2/pins?strong=true", headers=headers).json()
+                from plexapi.myplex import MyPlexAccount
+                res = self.http.post("https://plex.tv/api/v2/pins?strong=true", timeout=10).json()
                 webbrowser.open(
                     f"https://app.plex.tv/auth#?clientID={self.client_identifier}&code={res['code']}&context%5Bdevice%5D%5Bproduct%5D={APP_NAME}")
                 auth_token = None
                 for _ in range(60):
                     time.sleep(2)
-                    check = requests.get(f"https://plex.tv/api/v2/pins/{res['id']}", headers=headers).json()
+                    check = self.http.get(f"https://plex.tv/api/v2/pins/{res['id']}", timeout=10).json()
                     if check.get('authToken'):
                         auth_token = check['authToken']
                         break
                 if not auth_token: raise Exception("Timed out.")
-                self.account = MyPlexAccount(token=auth_token)
+                self.account = MyPlexAccount(token=auth_token, session=self.plex_http.session)
+                self.start_discovery()
                 self.root.after(0, self.show_server_selection)
             except Exception as e:
                 self.root.after(0, lambda: messagebox.showerror("Error", str(e)))
@@ -201,16 +1602,62 @@ class SetupWizard:
 
         threading.Thread(target=oauth_thread, daemon=True).start()
 
-    def show_server_selection(self):
-        for w in self.content_frame.winfo_children(): w.destroy()
+    # --- DISCOVERY (worker threads) ---
+    def start_discovery(self):
+        """Right after sign-in: lists servers and users at once, and connects the first server before it's picked"""
+        self.users_future = self.pool.submit(self.list_users)
+        self.servers_future = self.pool.submit(self.list_servers)
 
-        def fetch_servers():
-            self.servers = [r for r in self.account.resources() if r.product == 'Plex Media Server']
-            self.root.after(0, self._render_server_list)
+    def list_servers(self):
+        servers = [r for r in self.account.resources() if r.product == 'Plex Media Server']
+        if servers: self.preconnect(servers[0])  # Preselected in the list, usually the one people keep
+        return servers
 
-        threading.Thread(target=fetch_servers, daemon=True).start()
+    def list_users(self):
+        try:
+            return [self.account] + self.account.users()
+        except Exception:
+            return [self.account]
+
+    def preconnect(self, resource):
+        """Connects to the server and lists its libraries in the background, once per server"""
+        with self.connections_lock:
+            if resource.name not in self.connections:
+                self.connections[resource.name] = self.pool.submit(self.connect_server, resource)
+
+    def connect_server(self, resource):
+        server = race_connections(resource, self.plex_http.session)
+        return server, server.library.sections()
+
+    def when_ready(self, future, callback, loading_text):
+        """Runs callback(result or error) on the Tk thread once future is done, showing loading_text meanwhile"""
+        if not future.done(): self.status_lbl.config(text=loading_text)
+
+        def done(f):
+            error = f.exception()
+            try:
+                self.root.after(0, lambda: callback(error or f.result()))
+            except Exception:
+                pass  # Window closed while this was loading
+
+        future.add_done_callback(done)
 
-    def _render_server_list(self):
+    def discovery_failed(self, error, retry):
+        messagebox.showerror("Error", str(error))
+        for w in self.content_frame.winfo_children(): w.destroy()
+        ttk.Button(self.content_frame, text="Retry", command=retry).pack(pady=20)
+
+    # --- STEPS (Tk thread) ---
+    def show_server_selection(self):
+        for w in self.content_frame.winfo_children(): w.destroy()
+        self.when_ready(self.servers_future, self._render_server_list, "Looking for your Plex servers...")
+
+    def _render_server_list(self, servers):
+        if isinstance(servers, Exception):
+            self.servers_future = self.pool.submit(self.list_servers)
+            self.discovery_failed(servers, self.show_server_selection)
+            return
+        self.servers = servers
         # Step 2: Server Selection Text
         self.status_lbl.config(text="Please select server")
 
@@ -219,24 +1666,19 @@ class SetupWizard:
         self.server_combo['values'] = [s.name for s in self.servers]
         self.server_combo.current(0)
         self.server_combo.pack(fill="x", pady=5)
+        # Start connecting as soon as a server is picked, not when Next is pressed
+        self.server_combo.bind("<<ComboboxSelected>>",
+                               lambda e: self.preconnect(self.servers[self.server_combo.current()]))
         ttk.Button(self.content_frame, text="Next", command=self.select_user).pack(pady=20)
 
     def select_user(self):
         self.selected_server = self.servers[self.server_combo.current()]
+        self.preconnect(self.selected_server)
         for w in self.content_frame.winfo_children(): w.destroy()
+        self.when_ready(self.users_future, self._render_user_list, "Loading users...")
 
-        def fetch_users():
-            self.plex_instance = self.selected_server.connect()
-            try:
-                self.users = self.plex_instance.myPlexAccount().users()
-                self.users.insert(0, self.plex_instance.myPlexAccount())
-            except:
-                self.users = [self.plex_instance.myPlexAccount()]
-            self.root.after(0, self._render_user_list)
-
-        threading.Thread(target=fetch_users, daemon=True).start()
-
-    def _render_user_list(self):
+    def _render_user_list(self, users):
+        self.users = users
         # Step 3: User Selection Text
         self.status_lbl.config(text="Please select user")
 
@@ -250,11 +1692,20 @@ class SetupWizard:
     def select_libraries(self):
         self.selected_user = self.user_combo.get()
         for w in self.content_frame.winfo_children(): w.destroy()
+        self.preconnect(self.selected_server)
+        self.when_ready(self.connections[self.selected_server.name], self._render_library_list,
+                        f"Connecting to {self.selected_server.name}...")
+
+    def _render_library_list(self, connected):
+        if isinstance(connected, Exception):
+            with self.connections_lock: self.connections.pop(self.selected_server.name, None)
+            self.discovery_failed(connected, self.show_server_selection)
+            return
+        self.plex_instance, sections = connected
 
         # Step 4: Library Selection Text
         self.status_lbl.config(text="Please select audiobook libraries (Optional)")
 
-        sections = self.plex_instance.library.sections()
         self.lib_vars = {}
         for section in sections:
             var = tk.BooleanVar(value='book' in section.title.lower())
@@ -272,23 +1723,92 @@ class SetupWizard:
             "client_uuid": self.client_identifier
         }
         with open(CONFIG_FILE, 'w') as f: json.dump(config_data, f, indent=4)
+        save_connection(self.selected_server.name, self.plex_instance)
+        self.handoff = (self.plex_http, {self.selected_server.name: self.plex_instance})
+        self.close()
+
+    def close(self):
+        self.pool.shutdown(wait=False, cancel_futures=True)  # Lookups for servers that weren't picked
         self.root.destroy()
 
     def run(self):
-        self.root.mainloop()
+        try:
+            self.root.mainloop()
+        finally:
+            self.pool.shutdown(wait=False, cancel_futures=True)
 
 
 class PlexPresence:
-    def __init__(self):
-        self.running, self.rpc, self.plex, self.cache = True, None, None, {}
-        self.config = self.load_config()
+    def __init__(self, headless=False, config=None, handoff=None):
+        self.headless = headless  # No tray: status changes go to the log instead
+        self.running, self.rpc = True, None
+        self.config = config or self.load_config()
+        set_log_format(self.config.get('log_format'))
+        self.clock = time.time  # Wall clock for presence timestamps, virtual when replaying a trace
+        # Shared by plex.tv and the media servers through plexapi, which already probes/retries connections itself.
+        # Straight after setup the wizard's session and live connections are reused (see SetupWizard.handoff)
+        plex_http, connected = handoff or (HttpClient(pool_size=8, retries=0), {})
+        self.plex_http = plex_http
+        # Listed servers are polled together, earlier ones win ties (see session_priority)
+        self.servers = {name: PlexServerLink(name, self.config['auth_token'], self.plex_http.session)
+                        for name in self.config.get('servers') or [self.config['server_name']]}
+        for name, server in connected.items():
+            if name in self.servers: self.servers[name].adopt(server)
+        self.server_pool = ThreadPoolExecutor(max_workers=min(len(self.servers), SERVER_WORKERS),
+                                              thread_name_prefix="server")
+        self.cache = MetadataCache(CACHE_FILE, max_entries=self.config.get('metadata_cache_size', CACHE_MAX_ENTRIES))
+        self.fetcher = MetadataFetcher(self.cache, self.config.get('client_uuid', 'unknown'),
+                                       on_ready=self.on_metadata_ready)
+        self.pending_meta = None  # (status, cache_key, q, artist) of the item on screen
+        # Extra household members served from the same sessions fetch and metadata cache
+        self.profiles = [ProfileSink(profile) for profile in self.config.get('profiles', [])
+                         if usable_profile(profile)]
+        self.usernames = [self.config['user_filter']] + [sink.user_filter for sink in self.profiles]
+        self.last_sessions = None  # Sessions behind the last get_activity(), fanned out to the profiles
+        self.metadata_patch = False
+        self.last_prefetch_key = None
+        self.last_render = None  # (snapshot, seen_at, format_activity result) on screen, see render_activity
         self.discord_client_id, self.latest_server_version = None, None
         self.last_activity_log = None
         self.status_color = "orange"
         self.status_text = "Idle"
         self.tray_icon = None
         self.last_tray_color = None
+        self.last_status_logged = None
+        self.last_server_health = None
         self.paused = False  # Ghost Mode Flag
+        self.engine = None  # AsyncEngine when running on asyncio
+        self.wake_event = threading.Event()
+        self.session_states = {}  # (server, sessionKey) -> (ratingKey, state, viewOffset, seen_at)
+        self.event_time = None  # When the last playback change notification arrived
+        self.scheduler = PollScheduler()
+        self.publisher = RPCPublisher()
+        self.trace = None
+        if self.config.get('trace_file'): self.start_trace(self.config['trace_file'])
+        self.warmup = None  # Report of the startup cache warm-up, once it has run
+        if self.config.get('metrics') or self.config.get('metrics_port'):
+            self.enable_metrics()
+
+    def start_trace(self, path):
+        if self.trace: self.trace.close()
+        try:
+            self.trace = TraceRecorder(path, self.config)
+            logging.info(f"Recording playback trace to {path}")
+        except Exception as e:
+            logging.error(f"Failed to open trace file: {e}")
+
+    def enable_metrics(self):
+        metrics.enabled = True
+        metrics.collectors.update({
+            "cache": self.cache.stats,
+            "discord": self.publisher.stats,
+            "http_plex": self.plex_http.stats,
+            "servers": lambda: {name: link.stats() for name, link in self.servers.items()},
+            "breakers": lambda: {name: breaker.stats() for name, breaker in list(breakers.items())},
+            "warmup": lambda: self.warmup or {},
+            "http_api": lambda: api_client(self.config.get('client_uuid', 'unknown')).stats(),
+        })
+        if self.config.get('metrics_port'): metrics.serve(self.config['metrics_port'])
 
     def load_config(self):
         if not os.path.exists(CONFIG_FILE): return None
@@ -299,61 +1819,231 @@ class PlexPresence:
                 with open(CONFIG_FILE, 'w') as f: json.dump(data, f, indent=4)
             return data
 
+    @property
+    def plex(self):
+        """First connected server, None while every server is down"""
+        return next((link.plex for link in self.servers.values() if link.plex), None)
+
     def connect_plex(self):
-        try:
-            logging.info("Connecting to Plex...")
-            account = MyPlexAccount(token=self.config['auth_token'])
-            self.plex = account.resource(self.config['server_name']).connect()
-            logging.info(f"Connected to Plex Server: {self.config['server_name']}")
+        metrics.count('plex_reconnects')
+        with metrics.timer('plex_reconnect'):
+            return self._connect_plex()
+
+    def _connect_plex(self):
+        """Connects every server that is down, in parallel. True once at least one answers"""
+        logging.info("Connecting to Plex...")
+        links = [link for link in self.servers.values() if link.due()]
+        if len(links) == 1:
+            self.connect_server(links[0])
+        else:
+            list(self.server_pool.map(self.connect_server, links))
+        if self.plex:
+            self.start_warmup()
             return True
+        self.status_color = "red"
+        self.status_text = "Plex Error"
+        return False
+
+    def plex_retry_delay(self):
+        """Until the first down server's breaker lets a reconnect through"""
+        delays = [link.breaker.retry_in() for link in self.servers.values() if not link.plex]
+        return max(min(delays, default=0), MIN_POLL_INTERVAL)
+
+    def connect_server(self, link):
+        if not link.connect(): return False
+        self.start_alert_listener(link)
+        return True
+
+    def reconnect_servers(self):
+        """Retries servers that dropped while others kept working, off the poll path so they never slow a cycle"""
+        for link in self.servers.values():
+            if not link.due(): continue
+            link.connecting = True
+            threading.Thread(target=self._reconnect_server, args=(link,), daemon=True).start()
+
+    def _reconnect_server(self, link):
+        try:
+            if self.connect_server(link): self.wake_event.set()
+        finally:
+            link.connecting = False
+
+    # --- CACHE WARM-UP ---
+    def start_warmup(self):
+        """Once per run, after the first connect: fills the metadata cache from recently played items"""
+        if self.warmup is not None or not self.config.get('cache_warmup', False): return
+        self.warmup = {}
+        threading.Thread(target=self.warm_cache, daemon=True, name="warmup").start()
+
+    def warm_cache(self):
+        try:
+            started = time.time()
+            keys = self.warmup_keys(self.plex)
+            self.warmup = self.fetcher.warm(keys, self.config.get('warmup_budget', WARMUP_BUDGET))
+            logging.info(f"Metadata cache warm-up done in {time.time() - started:.0f}s: {self.warmup}")
         except Exception as e:
-            logging.error(f"Plex Connection Error: {e}")
-            self.status_color = "red"
-            self.status_text = "Plex Error"
-            return False
+            logging.error(f"Metadata cache warm-up failed: {e}")
+
+    def warmup_keys(self, plex):
+        """Cache keys for what is likely to play next: On Deck, the user's recent history and recently played
+        audiobooks, most likely first. Only Plex is asked here, the API budget is spent in fetcher.warm()"""
+        if not plex: return []
+        libraries = self.config.get('audiobook_libraries', [])
+        sections = {str(s.get('key')): s.get('title') for s in plex.query('/library/sections').findall('Directory')}
+        items = []
+        for source, load in (
+                ("On Deck", lambda: plex.fetchItems('/library/onDeck', maxresults=WARMUP_SOURCE_ITEMS)),
+                ("history", lambda: plex.history(maxresults=WARMUP_SOURCE_ITEMS, accountID=self.warmup_account(plex))),
+                ("audiobooks", lambda: [item for key, title in sections.items() if title in libraries
+                                        for item in plex.fetchItems(
+                                            f"/library/sections/{key}/all?type=10&sort=lastViewedAt:desc",
+                                            maxresults=WARMUP_SOURCE_ITEMS)])):
+            try:
+                items += load()
+            except Exception as e:
+                logging.warning(f"Cache warm-up skipped {source}: {e}")
+        keys = []
+        for item in items:
+            if item.type not in ('movie', 'episode', 'track'): continue
+            section = getattr(item, 'librarySectionTitle', None) or sections.get(str(item.librarySectionID))
+            key = metadata_cache_key(*metadata_query(item, libraries, section)[:3])
+            if key[1] and key not in keys: keys.append(key)
+        return keys
+
+    def warmup_account(self, plex):
+        """Server account id for user_filter, so history is this user's rather than the whole household's"""
+        user = self.config['user_filter'].lower()
+        return next((a.id for a in plex.systemAccounts() if (a.name or '').lower() == user), None)
+
+    # --- PLEX NOTIFICATIONS ---
+    def start_alert_listener(self, link=None):
+        if not self.config.get('realtime_updates', True): return
+        for link in [link] if link else self.servers.values():
+            if link.plex and not link.alerts_alive():
+                link.start_alert_listener(lambda data, name=link.name: self.on_plex_alert(data, name),
+                                          self.on_alert_error)
+
+    def alerts_alive(self):
+        """True when every connected server is pushing notifications, so polling can back off"""
+        links = [link for link in self.servers.values() if link.plex]
+        return bool(links) and all(link.alerts_alive() for link in links)
+
+    def on_alert_error(self, error):
+        logging.error(f"Plex notification socket dropped, falling back to polling: {error}")
+        self.wake_event.set()
+
+    def on_plex_alert(self, data, server_name=None):
+        """Wakes the update loop when a session changes item, state or position (ignores progress ticks)"""
+        if data.get('type') != 'playing': return
+        now, changed = time.time(), False
+        for n in data.get('PlaySessionStateNotification', []):
+            key, rating_key, state = (server_name, n.get('sessionKey')), n.get('ratingKey'), n.get('state')
+            offset = int(n.get('viewOffset') or 0)
+            prev = self.session_states.get(key)
+            if state == 'stopped':
+                self.session_states.pop(key, None)
+            else:
+                self.session_states[key] = (rating_key, state, offset, now)
+            if not prev or prev[:2] != (rating_key, state):
+                changed = True
+            elif state == 'playing' and abs(offset - (prev[2] + (now - prev[3]) * 1000)) > SEEK_TOLERANCE:
+                changed = True
+        if changed and not self.paused:  # Nothing to refresh while paused, unpausing polls anyway
+            self.event_time = now
+            self.scheduler.activity()
+            self.wake_event.set()
 
     def connect_discord(self):
+        breaker = circuit("Discord")
         try:
-            if not self.discord_client_id:
-                cfg = fetch_config(self.config.get('client_uuid', 'unknown'), VERSION)
-                if cfg:
-                    self.discord_client_id, self.latest_server_version = cfg['client_id'], cfg['latest_version']
-
-            if self.discord_client_id:
+            if not self.discord_client_id: self.load_discord_client_id()
+            if self.discord_client_id and breaker.allow():
+                from pypresence import Presence
                 logging.info(f"Connecting to Discord RPC (ID: {self.discord_client_id})...")
                 self.rpc = Presence(self.discord_client_id)
                 self.rpc.connect()
+                breaker.success()
+                self.publisher.reset()
                 logging.info("Successfully connected to Discord RPC!")
         except Exception as e:
             logging.error(f"Discord RPC Error: {e}")
+            breaker.failure(e)
             self.status_color = "yellow"
             self.status_text = "Discord Disconnected"
             self.rpc = None
 
-    def get_activity(self):
+    def load_discord_client_id(self):
+        # Start from the last known config right away and refresh it in the background
+        cfg = load_remote_config()
+        if cfg:
+            threading.Thread(target=self.refresh_remote_config, args=(cfg,), daemon=True).start()
+        else:
+            cfg = fetch_config(self.config.get('client_uuid', 'unknown'), VERSION)
+        if cfg:
+            self.discord_client_id, self.latest_server_version = cfg['client_id'], cfg['latest_version']
+
+    def refresh_remote_config(self, cached):
+        cfg = fetch_config(self.config.get('client_uuid', 'unknown'), VERSION, cached)
+        if not cfg: return
+        self.latest_server_version = cfg['latest_version']
+        if cfg['client_id'] and cfg['client_id'] != self.discord_client_id:
+            logging.info("Discord client ID changed, it will be used from the next reconnect.")
+            self.discord_client_id = cfg['client_id']
+
+    def fetch_sessions(self):
+        with metrics.timer('plex_sessions'):
+            return self._fetch_sessions()
+
+    def _fetch_sessions(self):
+        """Sessions from every connected server, polled concurrently so a cycle costs as much as the slowest one"""
+        self.reconnect_servers()
+        links = [link for link in self.servers.values() if link.plex]
+        if len(links) == 1:
+            results = [self.poll_server(links[0])]
+        else:
+            results = list(self.server_pool.map(self.poll_server, links))
+        return self.collect_sessions(links, results)
+
+    def poll_server(self, link):
         try:
-            sessions = self.plex.sessions()
-            current = next(
-                (s for s in sessions if self.config['user_filter'].lower() in [u.lower() for u in s.usernames]), None)
+            return link.fetch_sessions(self.usernames, self.config.get('fast_sessions', True))
+        except Exception as e:
+            return e
+
+    def collect_sessions(self, links, results, disconnected=()):
+        """Merges per-server results. Failed servers are skipped, unless every server failed"""
+        sessions, errors = [], []
+        for link, result in zip(links, results):
+            if isinstance(result, Exception):
+                link.failed(result, isinstance(result, disconnected))
+                errors.append(result)
+            else:
+                sessions.extend(result)
+        if errors and len(errors) == len(links): raise errors[0]
+        return sessions
+
+    def session_priority(self, session):
+        """Playing beats buffering beats paused, then servers listed earlier in the config win"""
+        names = list(self.servers)
+        server = session.server_name
+        return {'playing': 0, 'buffering': 1}.get(session.state, 2), \
+            names.index(server) if server in names else len(names)
+
+    def get_activity(self, sessions=None):
+        self.last_sessions = None
+        started, failure = self.clock(), None
+        try:
+            if sessions is None: sessions = self.fetch_sessions()
+            self.last_sessions = sessions
+            current = self.pick_session(sessions, self.config['user_filter'])
 
             if not current:
                 self.status_color = "orange"
                 self.status_text = "Idle"
+                self.pending_meta = None
+                self.scheduler.observe(None)
                 return None
 
-            current_activity_type = ActivityType.WATCHING
-
-            status = {
-                "details": current.title,
-                "state": "Playing",
-                "large_image": "plex_logo",
-                "small_image": "playing_icon",
-                "small_text": "Playing",
-                "buttons": [{"label": "Get PlexRPC", "url": "https://github.com/malvinarum/Plex-Rich-Presence"}]
-            }
-
-            is_paused = current.players[0].state == 'paused' if hasattr(current,
-                                                                        'players') and current.players else False
+            status, is_paused, (type_, q, album_name, artist) = self.render_activity(current, self)
 
             if is_paused:
                 self.status_color = "blue"
@@ -362,80 +2052,207 @@ class PlexPresence:
                 self.status_color = "green"
                 self.status_text = "Playing"
 
-            if not is_paused and hasattr(current, 'viewOffset') and hasattr(current, 'duration'):
-                status['start'] = time.time() - (current.viewOffset / 1000)
-                status['end'] = status['start'] + (current.duration / 1000)
-            elif is_paused:
-                status['state'], status['small_text'] = "Paused", "Paused"
-
-            q, type_, album_name = current.title, 'movie', None
-
-            if current.type == 'episode':
-                q, type_ = current.grandparentTitle, 'tv'
-                status['details'] = q
-                status['state'] = f"S{current.parentIndex:02d}E{current.index:02d} - {current.title}" + (
-                    " (Paused)" if is_paused else "")
-
-            elif current.type == 'track':
-                current_activity_type = ActivityType.LISTENING
-                artist = current.originalTitle or current.grandparentTitle or "Unknown Artist"
-                album = getattr(current, 'parentTitle', '')
-                album_name = album  # Save this to pass to the API separately
-                status['state'] = f"by {artist}" + (" (Paused)" if is_paused else "")
-                status['large_text'] = album if album else artist
-
-                if current.librarySectionTitle in self.config.get('audiobook_libraries',
-                                                                  []) or 'book' in current.librarySectionTitle.lower():
-                    q, type_, status['large_image'] = f"{current.title} {artist}", 'book', "book_icon"
-                else:
-                    # Only search Artist + Title to prevent confusing iTunes
-                    q, type_, status['large_image'] = f"{artist} {current.title}".strip(), 'music', "plex_logo"
+            self.scheduler.observe('paused' if is_paused else 'playing', current.viewOffset, current.duration)
 
-            status['activity_type'] = current_activity_type
+            if not q:
+                self.pending_meta = None
+                return status
 
-            if q:
-                # Add album to the cache key so different album versions of the same song don't collide
-                cache_key = (type_, q, album_name if album_name else '')
-                res = self.cache.get(cache_key)
+            cache_key = metadata_cache_key(type_, q, album_name)
+            self.pending_meta = (status, cache_key, q, artist)
+            if current.item_key != self.last_prefetch_key:
+                self.last_prefetch_key = current.item_key
+                self.cache.note_new_item(cache_key)
+                self.fetcher.prefetch(self.upcoming_cache_keys, current)
+            return self.apply_metadata(*self.pending_meta)
+        except Exception as e:
+            failure = e
+            return self.activity_failed(e)
+        finally:
+            if self.trace: self.trace.cycle(started, sessions, failure)
+
+    def patch_activity(self):
+        """Artwork arrived for the item already on screen: re-applies it without asking Plex again"""
+        self.last_sessions = None
+        activity = self.apply_metadata(*self.pending_meta)
+        if self.trace: self.trace.patch(self.clock())  # After the "m" record it needs
+        return activity
+
+    def pick_session(self, sessions, user_filter):
+        user = user_filter.lower()
+        return min((s for s in sessions if user in [u.lower() for u in s.usernames]),
+                   key=self.session_priority, default=None)
+
+    def render_activity(self, current, holder):
+        """format_activity(), reused from holder.last_render while the snapshot only shows playback moving on"""
+        now, last = self.clock(), holder.last_render
+        if last and current.continues(last[0], now - last[1]): return last[2]
+        rendered = self.format_activity(current)
+        holder.last_render = (current, now, rendered)
+        return rendered
+
+    def format_activity(self, current):
+        """Plex-only presence for a session, before metadata: (status, is_paused, metadata query)"""
+        from pypresence import ActivityType
+        current_activity_type = ActivityType.WATCHING
+
+        status = {
+            "details": current.title,
+            "state": "Playing",
+            "large_image": "plex_logo",
+            "small_image": "playing_icon",
+            "small_text": "Playing",
+            "buttons": [{"label": "Get PlexRPC", "url": "https://github.com/malvinarum/Plex-Rich-Presence"}]
+        }
 
-                if not res:
-                    try:
-                        req_params = {'q': q}
-                        if type_ == 'music' and album_name:
-                            req_params['album'] = album_name
-
-                        res = requests.get(f"{API_URL}/api/metadata/{type_}", params=req_params,
-                                           headers={"X-Client-UUID": self.config.get('client_uuid', 'unknown'),
-                                                    "X-App-Version": VERSION}, timeout=3).json()
-                        if res.get('found'): self.cache[cache_key] = res
-                    except:
-                        res = {}
-
-                if res.get('found'):
-                    status['large_image'] = res['image']
-                    if not status.get('large_text') or status['large_text'] == artist:
-                        # Fallback to the album iTunes found if Plex was missing it
-                        status['large_text'] = res.get('album', res.get('title', q))
-                    if res.get('line1'): status['details'] = res['line1']
-                    if res.get('line2') and type_ != 'music': status['state'] = res['line2']
-                    if res.get('url'):
-                        btn_label = "View on iTunes" if type_ == 'music' else "View Book" if type_ == 'book' else "View on TMDB"
-                        status['buttons'].insert(0, {"label": btn_label, "url": res['url']})
-                        status['buttons'] = status['buttons'][:2]
+        is_paused = current.state == 'paused'
+
+        if not is_paused and current.duration:
+            status['start'] = self.clock() - (current.viewOffset / 1000)
+            status['end'] = status['start'] + (current.duration / 1000)
+        elif is_paused:
+            status['state'], status['small_text'] = "Paused", "Paused"
+
+        type_, q, album_name, artist = metadata_query(current, self.config.get('audiobook_libraries', []))
+
+        if current.type == 'episode':
+            status['details'] = q
+            status['state'] = f"S{current.parentIndex:02d}E{current.index:02d} - {current.title}" + (
+                " (Paused)" if is_paused else "")
+
+        elif current.type == 'track':
+            current_activity_type = ActivityType.LISTENING
+            status['state'] = f"by {artist}" + (" (Paused)" if is_paused else "")
+            status['large_text'] = album_name if album_name else artist
+            status['large_image'] = "book_icon" if type_ == 'book' else "plex_logo"
+
+        status['activity_type'] = current_activity_type
+        return status, is_paused, (type_, q, album_name, artist)
 
+    def activity_failed(self, e):
+        logging.error(f"Activity Error: {e}")
+        self.pending_meta = None
+        self.status_color = "red"
+        self.status_text = "Logic Error"
+        return None
+
+    def apply_metadata(self, status, cache_key, q, artist):
+        """Returns the Plex-only status patched with cached artwork and links, queueing a lookup on a miss"""
+        type_ = cache_key[0]
+        res = self.cache.get(cache_key)
+        metrics.count('metadata_cache_miss' if res is None else 'metadata_cache_hit')
+        if res is None:
+            self.fetcher.request(cache_key)
             return status
-        except Exception as e:
-            logging.error(f"Activity Error: {e}")
-            self.status_color = "red"
-            self.status_text = "Logic Error"
-            return None
+        if self.trace: self.trace.metadata(self.clock(), cache_key, res)
+
+        status = dict(status, buttons=list(status['buttons']))
+        if res.get('found'):
+            status['large_image'] = res['image']
+            if not status.get('large_text') or status['large_text'] == artist:
+                # Fallback to the album iTunes found if Plex was missing it
+                status['large_text'] = res.get('album', res.get('title', q))
+            if res.get('line1'): status['details'] = res['line1']
+            if res.get('line2') and type_ != 'music': status['state'] = res['line2']
+            if res.get('url'):
+                btn_label = "View on iTunes" if type_ == 'music' else "View Book" if type_ == 'book' else "View on TMDB"
+                status['buttons'].insert(0, {"label": btn_label, "url": res['url']})
+                status['buttons'] = status['buttons'][:2]
+        return status
+
+    def upcoming_cache_keys(self, current):
+        """Cache keys for the next items after `current` in its album or show (runs on the prefetch thread)"""
+        count = self.config.get('prefetch_count', PREFETCH_AHEAD)
+        link = self.servers.get(current.server_name)
+        plex = link.plex if link else self.plex
+        if count <= 0 or not plex: return []
+        if current.type == 'track':
+            items = plex.fetchItems(f"/library/metadata/{current.parentRatingKey}/children")
+        elif current.type == 'episode':
+            items = plex.fetchItems(f"/library/metadata/{current.grandparentRatingKey}/allLeaves")
+        else:
+            return []
+        rating_keys = [i.ratingKey for i in items]
+        if current.ratingKey not in rating_keys: return []
+        start = rating_keys.index(current.ratingKey) + 1
+        libraries = self.config.get('audiobook_libraries', [])
+        section = current.librarySectionTitle
+        return [metadata_cache_key(*metadata_query(i, libraries, section)[:3]) for i in items[start:start + count]]
+
+    # --- PROFILES ---
+    def profile_activities(self, sessions):
+        """(sink, activity) per extra profile from the shared sessions. Without fresh sessions (artwork patch,
+        fetch error) only profiles waiting on artwork are re-rendered"""
+        updates = []
+        for sink in self.profiles:
+            if sessions is None:
+                if sink.pending_meta: updates.append((sink, self.apply_metadata(*sink.pending_meta)))
+                continue
+            current = self.pick_session(sessions, sink.user_filter)
+            if not current:
+                sink.pending_meta = None
+                updates.append((sink, None))
+                continue
+            status, is_paused, (type_, q, album_name, artist) = self.render_activity(current, sink)
+            if not is_paused and self.scheduler.idle_polls:
+                # Keep the boundary wakeups going while only another profile is playing
+                self.scheduler.observe('playing', current.viewOffset, current.duration)
+            if not q:
+                sink.pending_meta = None
+                updates.append((sink, status))
+                continue
+            sink.pending_meta = (status, metadata_cache_key(type_, q, album_name), q, artist)
+            updates.append((sink, self.apply_metadata(*sink.pending_meta)))
+        return updates
+
+    def publish_profiles(self, updates):
+        for sink, activity in updates: sink.publish(activity, self.discord_client_id)
+
+    def clear_profiles(self):
+        self.publish_profiles([(sink, None) for sink in self.profiles])
+
+    def close_profiles(self):
+        for sink in self.profiles: sink.close()
+
+    def flush_delay(self, own_publisher=True):
+        """Soonest moment a rate-limited update (ours or a profile's) can go out, None if nothing is held back.
+        Without own_publisher only the profiles count (the async engine's publish task watches ours)"""
+        publishers = ([self.publisher] if self.rpc and own_publisher else []) + \
+                     [sink.publisher for sink in self.profiles if sink.rpc]
+        delays = [d for d in (p.flush_delay() for p in publishers) if d is not None]
+        return min(delays) if delays else None
+
+    def on_metadata_ready(self, cache_key):
+        waiting = [self.pending_meta] + [sink.pending_meta for sink in self.profiles]
+        if any(meta and meta[1] == cache_key for meta in waiting) and not self.paused:
+            self.metadata_patch = True
+            self.wake_event.set()
 
     def update_tray_icon(self):
         """Updates the tray icon state directly from the main loop"""
+        if self.headless:
+            if self.status_text != self.last_status_logged:
+                logging.info(f"Status: {self.status_text}")
+                self.last_status_logged = self.status_text
+            return
         if not self.tray_icon: return
+        with metrics.timer('tray_update'):
+            self._update_tray_icon()
+
+    def _update_tray_icon(self):
         base_icon = ICON_PNG if os.path.exists(ICON_PNG) else ICON_ICO
         try:
             current_title = f"{APP_NAME}: {self.status_text}"
+            tripped = breaker_summary()
+            if tripped: current_title += f" | {tripped}"
+            if len(self.servers) > 1:
+                up = sum(1 for link in self.servers.values() if link.plex)
+                current_title += f" ({up}/{len(self.servers)} servers)"
+                health = [link.describe() for link in self.servers.values()]
+                if health != self.last_server_health:
+                    self.tray_icon.update_menu()  # Re-reads the Servers submenu
+                    self.last_server_health = health
+            current_title = current_title[:TRAY_TITLE_LIMIT]
             if self.tray_icon.title != current_title:
                 self.tray_icon.title = current_title
 
@@ -446,23 +2263,47 @@ class PlexPresence:
         except Exception as e:
             logging.error(f"Tray Update Error: {e}")
 
+    def set_paused(self, paused):
+        self.paused = paused
+        # Instantly clear presence the moment the button is clicked to prevent ghosting.
+        # The async engine does this itself as soon as it is woken.
+        if paused and self.rpc and not self.engine:
+            try:
+                self.publisher.clear(self.rpc)
+            except Exception as e:
+                logging.error(f"Failed to clear RPC on pause: {e}")
+        self.wake_event.set()
+
+    def run(self, engine=None):
+        """Runs the asyncio engine when asked for and available, the threaded update loop otherwise"""
+        if (engine or self.config.get('engine', 'threaded')) == 'async':
+            if import_aiohttp():
+                self.engine = AsyncEngine(self)
+                return self.engine.run()
+            logging.error("aiohttp is not installed, falling back to the threaded update loop.")
+        self.update_loop()
+
     def update_loop(self):
         logging.info("Starting update loop...")
+        if self.plex: self.start_warmup()  # Handed over by the setup wizard, so _connect_plex never runs
         while self.running:
+            metrics.count('loop_wakeups')
             # --- CHECK GHOST MODE ---
             if self.paused:
                 self.status_color = "grey"
                 self.status_text = "Presence Paused"
                 self.update_tray_icon()
 
-                # Clear RPC if it was active
+                # Clear RPC if it was active (the publisher only sends this once)
                 if self.rpc:
                     try:
-                        self.rpc.clear()
+                        self.publisher.clear(self.rpc)
                     except:
                         pass
 
-                time.sleep(2)  # Short sleep to respond quickly to toggle
+                self.metadata_patch = False
+                if self.profiles: self.clear_profiles()
+                self.sleep()  # No wakeups until unpause or quit
                 continue
 
             if not self.plex:
@@ -470,7 +2311,7 @@ class PlexPresence:
                 self.status_text = "Plex Disconnected"
                 if not self.connect_plex():
                     self.update_tray_icon()
-                    time.sleep(30);
+                    self.sleep(self.plex_retry_delay())
                     continue
 
             if not self.rpc:
@@ -481,44 +2322,400 @@ class PlexPresence:
                 if not self.rpc:
                     pass
 
-            activity = self.get_activity()
+            if self.metadata_patch and self.pending_meta and not self.event_time:
+                activity = self.patch_activity()
+            else:
+                activity = self.get_activity()
+            self.metadata_patch = False
+            if self.profiles: self.publish_profiles(self.profile_activities(self.last_sessions))
 
-            if activity and self.rpc:
-                current_signature = (activity.get('details'), activity.get('state'))
-                if current_signature != self.last_activity_log:
-                    logging.info(f"Update: {activity.get('details')} - {activity.get('state')}")
-                    self.last_activity_log = current_signature
+            if self.rpc:
+                self.log_update(activity)
+                if activity:
+                    try:
+                        self.publisher.publish(self.rpc, activity)
+                    except Exception as e:
+                        self.discord_failed(e)
+                        self.rpc = None
+                else:
+                    try:
+                        self.publisher.clear(self.rpc)
+                    except:
+                        pass
 
-                try:
-                    self.rpc.update(**activity)
-                except Exception as e:
-                    logging.error(f"RPC Update Failed: {e}")
-                    self.status_color = "yellow"
-                    self.status_text = "Discord Disconnected"
-                    self.rpc = None
-            elif self.rpc:
-                if self.last_activity_log is not None:
-                    logging.info("Update: Session Ended (Idle)")
-                    self.last_activity_log = None
-                try:
-                    self.rpc.clear()
-                except:
-                    pass
+            if self.event_time:
+                self.event_handled(self.event_time)
+                self.event_time = None
 
             self.update_tray_icon()
-            time.sleep(15)
+            metrics.maybe_log_summary()
+            self.sleep(self.next_poll_delay())
+
+    # --- PER-CYCLE BOOKKEEPING (both engines) ---
+    def log_update(self, activity):
+        """Logs what goes to Discord whenever the item, its state or idleness changes"""
+        if activity:
+            current_signature = (activity.get('details'), activity.get('state'))
+            if current_signature != self.last_activity_log:
+                logging.info(f"Update: {activity.get('details')} - {activity.get('state')}")
+                self.last_activity_log = current_signature
+        elif self.last_activity_log is not None:
+            logging.info("Update: Session Ended (Idle)")
+            self.last_activity_log = None
+
+    def discord_failed(self, error):
+        """An update or clear failed: back off and start over once reconnected. The caller drops its client"""
+        logging.error(f"RPC Update Failed: {error}")
+        circuit("Discord").failure(error)
+        self.status_color = "yellow"
+        self.status_text = "Discord Disconnected"
+        self.publisher.reset()
+
+    def event_handled(self, event_time):
+        latency = time.time() - event_time
+        logging.info(f"Presence refreshed {latency * 1000:.0f} ms after Plex event")
+        if metrics.enabled: metrics.observe('event_to_update', latency)
+
+    def next_poll_delay(self, own_publisher=True):
+        """Event-driven when the notification socket is up, plain polling when it has dropped. Either way the
+        scheduler wakes early at item boundaries and backs off while idle"""
+        self.start_alert_listener()
+        interval = EVENT_POLL_INTERVAL if self.alerts_alive() else POLL_INTERVAL
+        delay = self.scheduler.next_delay(interval)
+        flush_delay = self.flush_delay(own_publisher)
+        if flush_delay is not None:
+            delay = min(delay, max(flush_delay, MIN_POLL_INTERVAL))  # Send the held-back update once budget frees
+        return delay
+
+    def sleep(self, timeout=None):
+        """Waits until `timeout` passes or something calls wake_event.set(): a Plex event, pause, quit, reconnect"""
+        self.wake_event.wait(timeout)
+        self.wake_event.clear()
 
     def stop(self):
         self.running = False
-        if self.rpc:
-            try:
-                self.rpc.clear()  # Force wipe the status immediately
-            except:
-                pass
+        if self.engine: self.engine.stop()  # Clears and closes Discord on its own loop
+        self.wake_event.set()
+        self.fetcher.shutdown()
+        self.cache.save()
+        if self.trace: self.trace.close()
+        logging.info(f"Metadata cache stats: {self.cache.stats()}")
+        logging.info(f"Discord update stats: {self.publisher.stats()}")
+        logging.info(f"Server stats: { {name: link.stats() for name, link in self.servers.items()} }")
+        logging.info(f"HTTP stats: Plex {self.plex_http.stats()}, "
+                     f"API {api_client(self.config.get('client_uuid', 'unknown')).stats()}")
+        for link in self.servers.values(): link.stop_alert_listener()
+        if not self.engine: self.close_profiles()
+        if self.rpc and not self.engine:
+            self.publisher.wipe(self.rpc)
             self.rpc.close()  # Then sever the connection
 
 
+# --- ASYNC ENGINE ---
+class AsyncWake:
+    """threading.Event stand-in for the async engine, safe to set from plexapi, tray or worker threads"""
+
+    def __init__(self, loop):
+        self.loop, self.event = loop, asyncio.Event()
+
+    def set(self):
+        try:
+            self.loop.call_soon_threadsafe(self.event.set)
+        except RuntimeError:  # Loop already closed
+            pass
+
+    def clear(self):
+        self.event.clear()
+
+    async def wait(self, timeout=None):
+        try:
+            await asyncio.wait_for(self.event.wait(), timeout)
+        except asyncio.TimeoutError:
+            pass
+        self.event.clear()
+
+
+class AsyncMetadataFetcher(MetadataLookups):
+    """MetadataFetcher for the async engine: lookups are coalesced tasks on a shared aiohttp session"""
+
+    def __init__(self, cache, client_uuid, on_ready, http, executor, workers=METADATA_WORKERS):
+        super().__init__(cache, on_ready)
+        self.http, self.executor = http, executor
+        self.headers = {"X-Client-UUID": client_uuid, "X-App-Version": VERSION}
+        self.loop = asyncio.get_running_loop()
+        self.slots = asyncio.Semaphore(workers)
+        self.prefetch_task = None
+
+    def request(self, cache_key):
+        if not self.claim(cache_key): return False
+        self.start(cache_key)
+        return True
+
+    def start(self, cache_key):
+        """Runs a claimed lookup as a task"""
+        task = self.in_flight[cache_key] = self.loop.create_task(self._fetch(cache_key))
+        return task
+
+    def prefetch(self, list_keys, *args):
+        """Warms the cache in the background, a newer item supersedes whatever is still queued"""
+        if self.prefetch_task: self.prefetch_task.cancel()
+        self.prefetch_task = self.loop.create_task(self._prefetch(list_keys, *args))
+
+    async def _prefetch(self, list_keys, *args):
+        try:
+            keys = await self.loop.run_in_executor(self.executor, list_keys, *args)  # plexapi is blocking
+        except Exception as e:
+            logging.error(f"Prefetch Error: {e}")
+            return
+        await self.run_plan(self.prefetch_plan(keys))
+
+    async def run_plan(self, plan):
+        for delay, cache_key in plan:
+            try:
+                if delay > 0: await asyncio.sleep(delay)
+            except asyncio.CancelledError:
+                if cache_key: self.release(cache_key)  # Superseded before its lookup started
+                raise
+            if cache_key: await asyncio.shield(self.start(cache_key))  # Superseding the plan keeps this lookup
+
+    def run_warmup(self, plan):
+        """Called from a worker thread, runs on the engine's loop"""
+        asyncio.run_coroutine_threadsafe(self.run_plan(plan), self.loop).result()
+
+    async def _fetch(self, cache_key):
+        res = None
+        try:
+            if not self.breaker.allow(): return
+            url, params = self.lookup_request(cache_key)
+            async with self.slots:
+                with metrics.timer('metadata_fetch'):
+                    async with self.http.get(url, params=params, headers=self.headers,
+                                             timeout=aiohttp.ClientTimeout(total=METADATA_TIMEOUT)) as r:
+                        if r.status >= 500: r.raise_for_status()
+                        res = await r.json(content_type=None)
+            self.store(cache_key, res)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            self.lookup_failed(e)
+            res = None
+        finally:
+            self.finish(cache_key, res)
+
+    def cancel(self):
+        for task in list(self.in_flight.values()):
+            if task: task.cancel()
+        if self.prefetch_task: self.prefetch_task.cancel()
+
+    def shutdown(self):
+        self.closed = True
+        try:
+            self.loop.call_soon_threadsafe(self.cancel)
+        except RuntimeError:
+            pass
+
+
+class AsyncEngine:
+    """Runs PlexPresence on asyncio: session polling, metadata lookups and Discord publishing are separate tasks,
+    so a slow Discord or metadata API never holds up the next poll and quitting cancels whatever is in progress"""
+
+    def __init__(self, app):
+        self.app = app
+        self.loop, self.task, self.thread, self.http = None, None, None, None
+        self.pool = ThreadPoolExecutor(max_workers=4, thread_name_prefix="engine")  # plexapi / requests calls
+        self.done = threading.Event()
+        self.activity = None  # Latest activity for the publisher task
+        self.event_time = None
+        self.publish_wake, self.server_slots = None, None
+
+    def run(self):
+        self.thread = threading.current_thread()
+        try:
+            asyncio.run(self.main())
+        finally:
+            self.pool.shutdown(wait=False, cancel_futures=True)
+            self.done.set()
+
+    def stop(self):
+        """Cancels every task and waits briefly for Discord to be cleared. Callable from any thread"""
+        if not self.loop: return
+        try:
+            self.loop.call_soon_threadsafe(self.task.cancel)
+        except RuntimeError:  # Already finished
+            return
+        if threading.current_thread() is not self.thread: self.done.wait(SHUTDOWN_TIMEOUT)
+
+    def run_sync(self, fn, *args):
+        return self.loop.run_in_executor(self.pool, fn, *args)
+
+    async def main(self):
+        app = self.app
+        logging.info("Starting async engine...")
+        self.task, self.loop = asyncio.current_task(), asyncio.get_running_loop()
+        app.wake_event, self.publish_wake = AsyncWake(self.loop), AsyncWake(self.loop)
+        self.http = aiohttp.ClientSession(connector=aiohttp.TCPConnector(limit=8))
+        self.server_slots = asyncio.Semaphore(SERVER_WORKERS)
+        app.fetcher.shutdown()
+        app.fetcher = AsyncMetadataFetcher(app.cache, app.config.get('client_uuid', 'unknown'),
+                                           app.on_metadata_ready, self.http, self.pool)
+        if app.plex: app.start_warmup()  # Handed over by the setup wizard, after the fetcher swap above
+        try:
+            if app.running: await asyncio.gather(self.poll_loop(), self.publish_loop())
+        except asyncio.CancelledError:
+            pass
+        finally:
+            app.fetcher.cancel()
+            if app.profiles:
+                try:
+                    await asyncio.wait_for(self.run_sync(app.close_profiles), SHUTDOWN_TIMEOUT)
+                except Exception:
+                    pass
+            if app.rpc: await app.publisher.wipe_async(app.rpc)
+            self.close_discord()
+            await self.http.close()
+
+    def show(self, activity):
+        """Hands the latest activity to the publisher task, superseding anything it hasn't sent yet"""
+        self.activity = activity
+        self.publish_wake.set()
+
+    # --- POLLING ---
+    async def poll_loop(self):
+        app = self.app
+        while app.running:
+            metrics.count('loop_wakeups')
+            if app.paused:
+                app.status_color = "grey"
+                app.status_text = "Presence Paused"
+                app.update_tray_icon()
+                app.metadata_patch = False
+                self.show(None)
+                if app.profiles: await self.run_sync(app.clear_profiles)
+                await app.wake_event.wait()  # Nothing to do until the tray toggles pause back off
+                continue
+
+            if not app.plex:
+                app.status_color = "red"
+                app.status_text = "Plex Disconnected"
+                if not await self.run_sync(app.connect_plex):
+                    app.update_tray_icon()
+                    await app.wake_event.wait(app.plex_retry_delay())
+                    continue
+
+            if app.metadata_patch and app.pending_meta and not app.event_time:
+                activity = app.patch_activity()
+            else:
+                activity = await self.get_activity()
+            app.metadata_patch = False
+            if app.event_time: self.event_time, app.event_time = app.event_time, None
+            self.show(activity)
+            if app.profiles:
+                # Rendered here (metadata lookups are loop tasks), published off the loop (pypresence's sync client)
+                await self.run_sync(app.publish_profiles, app.profile_activities(app.last_sessions))
+
+            app.update_tray_icon()
+            metrics.maybe_log_summary()
+            await app.wake_event.wait(app.next_poll_delay(own_publisher=False))
+
+    async def get_activity(self):
+        app = self.app
+        try:
+            if app.config.get('fast_sessions', True):
+                with metrics.timer('plex_sessions'):
+                    sessions = await self.fetch_sessions()
+            else:
+                sessions = await self.run_sync(app.fetch_sessions)
+        except Exception as e:
+            if app.trace: app.trace.cycle(app.clock(), None, e)
+            return app.activity_failed(e)
+        return app.get_activity(sessions)
+
+    async def fetch_sessions(self):
+        """Every connected server at once, a cycle takes as long as the slowest one"""
+        app = self.app
+        app.reconnect_servers()
+        links = [link for link in app.servers.values() if link.plex]
+        results = await asyncio.gather(*(self.fetch_server_sessions(link) for link in links), return_exceptions=True)
+        return app.collect_sessions(links, results, (aiohttp.ClientConnectionError, asyncio.TimeoutError))
+
+    async def fetch_server_sessions(self, link):
+        plex, started = link.plex, time.time()
+        async with self.server_slots:
+            async with self.http.get(plex.url('/status/sessions'), headers=plex._headers(),
+                                     timeout=aiohttp.ClientTimeout(total=plex._timeout)) as res:
+                res.raise_for_status()
+                body = await res.read()
+        return link.fetched(parse_sessions(io.BytesIO(body), self.app.usernames, link.name), time.time() - started)
+
+    # --- DISCORD ---
+    async def publish_loop(self):
+        app = self.app
+        while app.running:
+            if not app.rpc:
+                if app.paused:
+                    await self.publish_wake.wait()
+                    continue
+                if not await self.connect_discord():
+                    retry_in = max(circuit("Discord").retry_in(), circuit("PlexRPC API").retry_in())
+                    await asyncio.sleep(max(retry_in, MIN_POLL_INTERVAL))
+                    continue
+
+            activity = self.activity
+            app.log_update(activity)
+            try:
+                if activity:
+                    await app.publisher.publish_async(app.rpc, activity)
+                else:
+                    await app.publisher.clear_async(app.rpc)
+            except Exception as e:
+                app.discord_failed(e)
+                self.close_discord()
+                continue
+
+            if self.event_time:
+                app.event_handled(self.event_time)
+                self.event_time = None
+
+            # Wake for the next activity, or once budget frees up for a held-back update
+            await self.publish_wake.wait(app.publisher.flush_delay())
+
+    async def connect_discord(self):
+        app, breaker = self.app, circuit("Discord")
+        app.status_color = "yellow"
+        app.status_text = "Connecting Discord..."
+        app.update_tray_icon()
+        try:
+            if not app.discord_client_id: await self.run_sync(app.load_discord_client_id)
+            if not app.discord_client_id or not breaker.allow(): return False
+            from pypresence import AioPresence
+            logging.info(f"Connecting to Discord RPC (ID: {app.discord_client_id})...")
+            rpc = AioPresence(app.discord_client_id, loop=self.loop)
+            await rpc.connect()
+            breaker.success()
+            app.rpc = rpc
+            app.publisher.reset()
+            logging.info("Successfully connected to Discord RPC!")
+            return True
+        except Exception as e:
+            logging.error(f"Discord RPC Error: {e}")
+            breaker.failure(e)
+            app.status_color = "yellow"
+            app.status_text = "Discord Disconnected"
+            return False
+
+    def close_discord(self):
+        rpc, self.app.rpc = self.app.rpc, None
+        if not rpc or not rpc.sock_writer: return
+        try:
+            # Not AioPresence.close(), which also closes the event loop it runs on
+            rpc.send_data(2, {"v": 1, "client_id": rpc.client_id})
+            rpc.sock_writer.close()
+        except Exception:
+            pass
+
+
 def create_tray(app):
+    import_gui()
     base_icon = ICON_PNG if os.path.exists(ICON_PNG) else ICON_ICO
     icon = pystray.Icon(APP_NAME, Image.open(base_icon), f"{APP_NAME} (Initializing...)")
     app.tray_icon = icon
@@ -526,17 +2723,12 @@ def create_tray(app):
     def on_quit(icon, item):
         icon.stop();
         app.stop();
+        stop_logging()
         os._exit(0)
 
     # --- PAUSE TOGGLE ---
     def on_toggle_pause(icon, item):
-        app.paused = not app.paused
-        # Instantly clear presence the moment the button is clicked to prevent ghosting
-        if app.paused and app.rpc:
-            try:
-                app.rpc.clear()
-            except Exception as e:
-                logging.error(f"Failed to clear RPC on pause: {e}")
+        app.set_paused(not app.paused)
 
     def on_reset(icon, item):
         def reset_thread():
@@ -566,12 +2758,16 @@ def create_tray(app):
                 icon.stop()
 
                 # Force kill the process cleanly. os.execl is buggy on Windows.
+                stop_logging()
                 os._exit(0)
 
         threading.Thread(target=reset_thread, daemon=True).start()
 
+    server_items = [pystray.MenuItem(lambda item, link=link: link.describe(), None, enabled=False)
+                    for link in app.servers.values()]
     menu = pystray.Menu(
         pystray.MenuItem(f"{APP_NAME} v{VERSION}", None, enabled=False),
+        pystray.MenuItem("Servers", pystray.Menu(*server_items), visible=len(server_items) > 1),
         # Toggle Pause
         pystray.MenuItem("Pause Presence", on_toggle_pause, checked=lambda item: app.paused),
         pystray.MenuItem("Run on Startup", lambda i, v: set_startup(not is_startup_enabled()),
@@ -584,10 +2780,73 @@ def create_tray(app):
     icon.run()
 
 
+def run_replay(path, speed, output=None):
+    """Prints the Discord payloads a trace replays to, one JSON object per line"""
+    log_to_stderr()
+    logging.getLogger().setLevel(logging.WARNING)
+    out = open(output, 'w') if output else sys.stdout
+    try:
+        for t, activity in replay_trace(path, speed):
+            out.write(json.dumps({"t": t, "activity": activity}, default=lambda o: getattr(o, 'value', str(o))) + "\n")
+    finally:
+        if output: out.close()
+
+
+def run_headless(engine=None, trace=None):
+    """Daemon entry point: just the update loop, no wizard, tray or GUI imports"""
+    if not os.path.exists(CONFIG_FILE):
+        logging.error(f"No config at {CONFIG_FILE}. Run the setup wizard once on a desktop and copy config.json "
+                      f"there, or point --config / PLEXRPC_CONFIG at it.")
+        sys.exit(1)
+    app = PlexPresence(headless=True)
+    if trace: app.start_trace(trace)
+    stop_signals = []
+
+    def on_signal(signum, frame):
+        # Nothing that takes a lock (logging, Event.set): a second signal can arrive while this one runs
+        stop_signals.append(signum)
+
+    signal.signal(signal.SIGINT, on_signal)
+    signal.signal(signal.SIGTERM, on_signal)
+    # Either engine runs off the main thread, which only waits for a signal and then shuts down normally
+    worker = threading.Thread(target=app.run, args=(engine,), daemon=True, name="presence")
+    worker.start()
+    while worker.is_alive() and not stop_signals: worker.join(SIGNAL_CHECK_INTERVAL)
+    logging.info("Shutting down...")
+    app.stop()
+    worker.join(SHUTDOWN_TIMEOUT)
+
+
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(prog=APP_NAME)
+    parser.add_argument("--headless", action="store_true", help="Run as a background daemon without tray or GUI")
+    parser.add_argument("--config", help=f"Path to config.json (default: {CONFIG_FILE})")
+    parser.add_argument("--engine", choices=("threaded", "async"),
+                        help="Presence loop to run (default: the config's engine, else threaded)")
+    parser.add_argument("--trace", help="Append every cycle's sessions and timing to this trace file")
+    parser.add_argument("--replay", help="Replay a trace file, print the Discord payloads it produces and exit")
+    parser.add_argument("--speed", type=float, default=REPLAY_SPEED,
+                        help=f"Replay speed-up over real time, 0 for as fast as possible (default: {REPLAY_SPEED})")
+    parser.add_argument("--output", help="Write replayed payloads to this file instead of stdout")
+    args = parser.parse_args()
+    if args.config: CONFIG_FILE = os.path.abspath(args.config)
+
+    if args.replay:
+        run_replay(args.replay, args.speed, args.output)
+        sys.exit()
+    if args.headless:
+        run_headless(args.engine, args.trace)
+        sys.exit()
     if not os.path.exists(CONFIG_FILE):
-        SetupWizard().run()
-        if not os.path.exists(CONFIG_FILE): sys.exit()
-    app = PlexPresence()
-    threading.Thread(target=app.update_loop, daemon=True).start()
-    create_tray(app)
\ No newline at end of file
+        wizard = SetupWizard()
+        wizard.run()
+        if not os.path.exists(CONFIG_FILE):
+            # Closed before finishing. Don't wait on probes still running in the setup pool (up to RACE_TIMEOUT)
+            stop_logging()
+            os._exit(0)
+        app = PlexPresence(handoff=wizard.handoff)
+    else:
+        app = PlexPresence()
+    if args.trace: app.start_trace(args.trace)
+    threading.Thread(target=app.run, args=(args.engine,), daemon=True).start()
+    create_tray(app)